@@ -0,0 +1,174 @@
+import copy
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+class AnalysisCache:
+    """
+    Two-tier cache for color extraction results: a bounded in-memory LRU plus an optional directory on disk
+
+    Disk entries are pickles and are loaded with pickle.load, so the cache directory must
+    be trusted: anyone who can write a file into it can run code in this process. Keep it
+    private to the app (not shared, not world-writable).
+    """
+
+    def __init__(self, max_entries=128, cache_dir=None, max_disk_entries=1024):
+        """
+        Args:
+            max_entries: Maximum number of results kept in memory
+            cache_dir: Optional trusted directory for results that survive process restarts
+            max_disk_entries: Maximum number of results kept in cache_dir; the least recently
+                used ones (by file modification time) are deleted beyond that
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def image_digest(image):
+        """Hash the decoded pixels of a PIL image together with its mode and size"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode('utf-8'))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def make_key(self, image_digest, **params):
+        """Build a cache key from an image digest and the extraction parameters"""
+        params_json = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.blake2b(f"{image_digest}|{params_json}".encode('utf-8'), digest_size=20).hexdigest()
+
+    def get(self, key):
+        """Get a cached result (a copy), or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._entries[key])
+
+        value = self._read_from_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, value)
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        """Store a result in memory and, if configured, on disk"""
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store(key, value)
+        self._write_to_disk(key, value)
+
+    def clear(self):
+        """Drop the in-memory entries (files on disk are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _read_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except Exception:
+            # Missing, truncated or foreign entries (unpickling can raise almost anything) are misses
+            return None
+        try:
+            # Mark the entry as recently used, so eviction drops older ones first
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _write_to_disk(self, key, value):
+        if not self.cache_dir:
+            return
+        try:
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        except OSError as e:
+            print(f"Could not write analysis cache entry: {str(e)}")
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._disk_path(key))
+        except Exception as e:
+            # Do not leave orphaned temporary files behind (e.g. on a full disk)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            print(f"Could not write analysis cache entry: {str(e)}")
+            return
+        self._evict_from_disk()
+
+    def _evict_from_disk(self):
+        """Delete the least recently used disk entries beyond max_disk_entries"""
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as scan:
+                for entry in scan:
+                    if entry.name.endswith('.pkl'):
+                        try:
+                            entries.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            # Removed by another process in the meantime
+                            pass
+        except OSError as e:
+            print(f"Could not list analysis cache directory: {str(e)}")
+            return
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_disk_entries]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache():
+    """
+    Process-wide cache configured from the environment:
+    ANALYSIS_CACHE_SIZE (in-memory entries, default 128), ANALYSIS_CACHE_DIR (optional disk
+    tier; entries are unpickled, so it must be a directory only this app can write to) and
+    ANALYSIS_CACHE_DISK_ENTRIES (entries kept on disk, default 1024)
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = AnalysisCache(
+                max_entries=int(os.getenv('ANALYSIS_CACHE_SIZE', '128')),
+                cache_dir=os.getenv('ANALYSIS_CACHE_DIR'),
+                max_disk_entries=int(os.getenv('ANALYSIS_CACHE_DISK_ENTRIES', '1024'))
+            )
+        return _default_cache
@@ -1,8 +1,7 @@
 import streamlit as st
 import numpy as np
-from PIL import Image
 import pandas as pd
-import io
+import os
 import time
 import hashlib
 from color_analyzer import ColorAnalyzer
@@ -10,32 +9,79 @@ from pencil_database import PencilDatabase
 from color_matcher import ColorMatcher
 from database import DatabaseManager
 from palette_exporter import PaletteExporter
+from analysis_cache import get_default_cache
+from compute_budget import get_default_budget
+from extraction_profile import ExtractionProfile
+import image_loader
+
+# Extraction mode for uploads; 'hierarchy' makes num_colors slider changes nearly free,
+# 'superpixels' clusters far fewer points and is less sensitive to noise
+EXTRACTION_MODE = os.getenv('EXTRACTION_MODE', 'pixels')
+
+# Color space uploads are clustered in ('rgb' or 'lab')
+CLUSTER_SPACE = os.getenv('CLUSTER_SPACE', 'rgb')
+
+# Optional target time for one color analysis ('pixels' and 'histogram' modes); once a larger
+# pixel sample would not finish in time, the palette of the largest one clustered so far is shown.
+# Uploads are analyzed at ANALYSIS_MAX_SIZE, which keeps the fixed part of the work small.
+ANALYSIS_DEADLINE_MS = float(os.getenv('ANALYSIS_DEADLINE_MS')) if os.getenv('ANALYSIS_DEADLINE_MS') else None
+
+# Optional precomputed match lookup table (see match_lut.py), e.g. pencil_match_lut.npy
+MATCH_LUT_PATH = os.getenv('MATCH_LUT_PATH')
+
+# Uploads are decoded straight to these sizes (longest side) instead of at full resolution
+DISPLAY_MAX_SIZE = 1024
+ANALYSIS_MAX_SIZE = 300
+
+@st.cache_resource
+def get_pencil_database():
+    """Process-wide pencil catalog shared by all sessions"""
+    return PencilDatabase()
+
+@st.cache_resource
+def get_color_matcher():
+    """Process-wide matcher over the shared catalog (its Lab arrays and indexes are read-only)"""
+    return ColorMatcher(get_pencil_database(), lut_path=MATCH_LUT_PATH)
+
+@st.cache_resource
+def get_color_analyzer():
+    """Process-wide color analyzer backed by the shared analysis cache"""
+    return ColorAnalyzer(cache=get_default_cache(), compute_budget=get_default_budget())
+
+@st.cache_resource
+def get_db_manager():
+    """Process-wide database manager using the shared SQLAlchemy engine"""
+    return DatabaseManager()
+
+@st.cache_resource
+def get_palette_exporter():
+    """Process-wide palette exporter"""
+    return PaletteExporter()
 
 def main():
     st.title("🎨 Colour Analysis & Pencil Matcher")
     st.markdown("Upload an image to analyze its colors and find matching Prismacolor and Faber Castell pencils!")
     
-    # Initialize components
-    if 'color_analyzer' not in st.session_state:
-        st.session_state.color_analyzer = ColorAnalyzer()
-        st.session_state.pencil_db = PencilDatabase()
-        st.session_state.color_matcher = ColorMatcher(st.session_state.pencil_db)
-        st.session_state.db_manager = DatabaseManager()
-        st.session_state.palette_exporter = PaletteExporter()
-        
-        # Create unique session ID for this user
-        if 'session_id' not in st.session_state:
-            # Generate session ID based on timestamp and random data
-            session_data = f"{time.time()}_{st.session_state.get('user_id', 'anonymous')}"
-            st.session_state.session_id = hashlib.md5(session_data.encode()).hexdigest()
-            st.session_state.db_manager.create_user_session(st.session_state.session_id)
+    # Shared components (one per process); sessions only hold their own IDs and results
+    color_analyzer = get_color_analyzer()
+    pencil_db = get_pencil_database()
+    color_matcher = get_color_matcher()
+    db_manager = get_db_manager()
+    palette_exporter = get_palette_exporter()
+    
+    # Create unique session ID for this user
+    if 'session_id' not in st.session_state:
+        # Generate session ID based on timestamp and random data
+        session_data = f"{time.time()}_{st.session_state.get('user_id', 'anonymous')}"
+        st.session_state.session_id = hashlib.md5(session_data.encode()).hexdigest()
+        db_manager.create_user_session(st.session_state.session_id)
     
     # Shopping links section
     with st.expander("🛒 Where to Buy Colored Pencils"):
         st.markdown("### Choose Your Country/Region:")
         
         # Country selection
-        countries = st.session_state.pencil_db.get_available_countries()
+        countries = pencil_db.get_available_countries()
         selected_country = st.selectbox(
             "Select your country for local retailers:",
             options=countries,
@@ -48,7 +94,7 @@ def main():
         col1, col2 = st.columns(2)
         
         # Show links for all available brands
-        available_brands = st.session_state.pencil_db.get_available_brands()
+        available_brands = pencil_db.get_available_brands()
         brands_per_col = 2
         num_cols = (len(available_brands) + brands_per_col - 1) // brands_per_col
         cols = st.columns(num_cols)
@@ -58,7 +104,7 @@ def main():
             if col_idx < len(cols):
                 with cols[col_idx]:
                     st.markdown(f"**{get_brand_emoji(brand)} {brand} Pencils:**")
-                    brand_links = st.session_state.pencil_db.get_purchase_links(brand, selected_country)
+                    brand_links = pencil_db.get_purchase_links(brand, selected_country)
                     if brand_links:
                         for retailer, url in brand_links.items():
                             st.markdown(f"• [{retailer}]({url})")
@@ -91,7 +137,7 @@ def main():
     # Database statistics
     st.sidebar.header("App Statistics")
     try:
-        stats = st.session_state.db_manager.get_statistics()
+        stats = db_manager.get_statistics()
         st.sidebar.metric("Total Analyses", stats['total_analyses'])
         st.sidebar.metric("Total Images", stats['total_uploads'])
         
@@ -111,14 +157,25 @@ def main():
     
     if uploaded_file is not None:
         try:
-            # Display original image
-            image = Image.open(uploaded_file)
+            # Pipeline results for this upload survive reruns, so widgets only re-render
+            upload_state = get_upload_state(uploaded_file)
+            
+            # Header only (size, format, mode); the full-resolution pixels are never decoded
+            if 'image' not in upload_state:
+                upload_state['image'] = image_loader.open_image(upload_state['file_bytes'])
+                upload_state['display_image'] = image_loader.load_image(
+                    upload_state['file_bytes'], DISPLAY_MAX_SIZE
+                )
+                upload_state['analysis_image'] = image_loader.reduce_image(
+                    upload_state['display_image'], ANALYSIS_MAX_SIZE
+                )
+            image = upload_state['image']
             
             col1, col2 = st.columns([1, 1])
             
             with col1:
                 st.subheader("Original Image")
-                st.image(image, caption="Uploaded Image", use_container_width=True)
+                st.image(upload_state['display_image'], caption="Uploaded Image", use_container_width=True)
             
             with col2:
                 st.subheader("Image Info")
@@ -127,51 +184,83 @@ def main():
                 st.write(f"**Format:** {image.format}")
                 st.write(f"**Mode:** {image.mode}")
             
-            # Save image to database
-            try:
-                image_bytes = io.BytesIO()
-                image.save(image_bytes, format=image.format or 'PNG')
-                image_data = image_bytes.getvalue()
-                
-                image_id = st.session_state.db_manager.save_image_upload(
-                    session_id=st.session_state.session_id,
-                    filename=uploaded_file.name,
-                    file_size=len(image_data),
-                    image_format=image.format or 'PNG',
-                    image_mode=image.mode,
-                    width=image.size[0],
-                    height=image.size[1],
-                    image_data=image_data
-                )
-            except Exception as db_error:
-                st.warning(f"Could not save to database: {str(db_error)}")
-                image_id = None  # Continue without database storage
+            # Save image to database (once per upload)
+            if 'image_id' not in upload_state:
+                try:
+                    # Store the uploaded file as-is instead of re-encoding the decoded image
+                    image_data = upload_state['file_bytes']
+                    
+                    upload_state['image_id'] = db_manager.save_image_upload(
+                        session_id=st.session_state.session_id,
+                        filename=uploaded_file.name,
+                        file_size=len(image_data),
+                        image_format=image.format or 'PNG',
+                        image_mode=image.mode,
+                        width=image.size[0],
+                        height=image.size[1],
+                        image_data=image_data
+                    )
+                except Exception as db_error:
+                    upload_state['warnings'].append(f"Could not save to database: {str(db_error)}")
+                    upload_state['image_id'] = None  # Continue without database storage
+            image_id = upload_state['image_id']
+            
+            # Results for each number of colors are kept, so moving the slider back is free too
+            analysis_state = upload_state['analyses'].setdefault(num_colors, {})
             
             # Analyze colors
-            with st.spinner("Analyzing colors..."):
-                start_time = time.time()
-                dominant_colors = st.session_state.color_analyzer.extract_dominant_colors(
-                    image, num_colors=num_colors
-                )
-                processing_time = time.time() - start_time
+            if 'dominant_colors' not in analysis_state:
+                with st.spinner("Analyzing colors..."):
+                    start_time = time.time()
+                    extraction_options = {'mode': EXTRACTION_MODE, 'cluster_space': CLUSTER_SPACE}
+                    if ANALYSIS_DEADLINE_MS is not None and EXTRACTION_MODE in ('pixels', 'histogram'):
+                        extraction_options['deadline_ms'] = ANALYSIS_DEADLINE_MS
+                    profile = ExtractionProfile()
+                    palette = color_analyzer.extract_palette(
+                        upload_state['analysis_image'], num_colors=num_colors,
+                        max_size=ANALYSIS_MAX_SIZE, profile=profile, **extraction_options
+                    )
+                    # Failed extractions are not kept, so the next rerun tries again
+                    if palette['colors']:
+                        analysis_state['dominant_colors'] = palette['colors']
+                        analysis_state['profile'] = profile.to_dict()
+                        analysis_state['converged'] = palette.get('converged', True)
+                        analysis_state['processing_time'] = time.time() - start_time
+            dominant_colors = analysis_state.get('dominant_colors')
             
-            if dominant_colors:
-                st.success(f"Extracted {len(dominant_colors)} dominant colors!")
-                
-                # Save color analysis to database
-                analysis_id = None
+            # Save color analysis to database
+            if dominant_colors and 'analysis_id' not in analysis_state:
+                analysis_state['analysis_id'] = None
                 if image_id is not None:
                     try:
-                        analysis_id = st.session_state.db_manager.save_color_analysis(
+                        analysis_state['analysis_id'] = db_manager.save_color_analysis(
                             image_id=image_id,
                             session_id=st.session_state.session_id,
                             num_colors_requested=num_colors,
                             colors_extracted=dominant_colors,
-                            processing_time=processing_time
+                            processing_time=analysis_state['processing_time']
+                        )
+                    except Exception as db_error:
+                        upload_state['warnings'].append(f"Could not save analysis to database: {str(db_error)}")
+                if analysis_state['analysis_id'] is not None:
+                    try:
+                        db_manager.save_analysis_profile(
+                            analysis_id=analysis_state['analysis_id'],
+                            session_id=st.session_state.session_id,
+                            profile=analysis_state['profile']
                         )
                     except Exception as db_error:
-                        st.warning(f"Could not save analysis to database: {str(db_error)}")
-                        analysis_id = None
+                        upload_state['warnings'].append(f"Could not save analysis profile to database: {str(db_error)}")
+            analysis_id = analysis_state.get('analysis_id')
+            
+            # Shown whether or not extraction succeeded
+            for warning in upload_state['warnings']:
+                st.warning(warning)
+            
+            if dominant_colors:
+                st.success(f"Extracted {len(dominant_colors)} dominant colors!")
+                if not analysis_state['converged']:
+                    st.caption("The analysis time target was reached, so these colors were estimated from a sample of the image's pixels.")
                 
                 # Display extracted colors
                 st.subheader("🎨 Extracted Colors")
@@ -239,7 +328,7 @@ def main():
                     # Export as image
                     layout = st.selectbox("Layout", ["horizontal", "grid"], key="layout_select")
                     if st.button("📸 Export as Image"):
-                        palette_img = st.session_state.palette_exporter.create_palette_image(
+                        palette_img = palette_exporter.create_palette_image(
                             dominant_colors, uploaded_file.name.split('.')[0], layout
                         )
                         st.download_button(
@@ -258,7 +347,7 @@ def main():
                             "num_colors": num_colors,
                             "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
                         }
-                        json_data = st.session_state.palette_exporter.export_as_json(dominant_colors, metadata)
+                        json_data = palette_exporter.export_as_json(dominant_colors, metadata)
                         st.download_button(
                             label="Download JSON",
                             data=json_data,
@@ -269,7 +358,7 @@ def main():
                 with export_cols[2]:
                     # Export as CSS
                     if st.button("🎨 Export as CSS"):
-                        css_data = st.session_state.palette_exporter.export_as_css(dominant_colors)
+                        css_data = palette_exporter.export_as_css(dominant_colors)
                         st.download_button(
                             label="Download CSS",
                             data=css_data,
@@ -280,7 +369,7 @@ def main():
                 with export_cols[3]:
                     # Export as CSV
                     if st.button("📊 Export as CSV"):
-                        csv_data = st.session_state.palette_exporter.export_as_csv(dominant_colors)
+                        csv_data = palette_exporter.export_as_csv(dominant_colors)
                         st.download_button(
                             label="Download CSV",
                             data=csv_data,
@@ -294,7 +383,7 @@ def main():
                     
                     with extra_cols[0]:
                         if st.button("Adobe Swatch"):
-                            ase_data = st.session_state.palette_exporter.export_as_adobe_swatch(
+                            ase_data = palette_exporter.export_as_adobe_swatch(
                                 dominant_colors, f"{uploaded_file.name.split('.')[0]} Palette"
                             )
                             st.download_button(
@@ -306,7 +395,7 @@ def main():
                     
                     with extra_cols[1]:
                         if st.button("SCSS Variables"):
-                            scss_data = st.session_state.palette_exporter.export_as_scss(dominant_colors)
+                            scss_data = palette_exporter.export_as_scss(dominant_colors)
                             st.download_button(
                                 label="Download SCSS",
                                 data=scss_data,
@@ -316,7 +405,7 @@ def main():
                     
                     with extra_cols[2]:
                         if st.button("Figma Compatible"):
-                            figma_data = st.session_state.palette_exporter.export_for_figma(dominant_colors)
+                            figma_data = palette_exporter.export_for_figma(dominant_colors)
                             st.download_button(
                                 label="Download Figma JSON",
                                 data=figma_data,
@@ -330,7 +419,7 @@ def main():
                 
                 with design_cols[0]:
                     if st.button("🎨 Affinity Apps (.afpalette)"):
-                        affinity_data = st.session_state.palette_exporter.export_for_affinity(dominant_colors)
+                        affinity_data = palette_exporter.export_for_affinity(dominant_colors)
                         st.download_button(
                             label="Download Affinity Palette",
                             data=affinity_data,
@@ -340,7 +429,7 @@ def main():
                 
                 with design_cols[1]:
                     if st.button("🌐 Photopea Compatible"):
-                        photopea_data = st.session_state.palette_exporter.export_for_photopea(dominant_colors)
+                        photopea_data = palette_exporter.export_for_photopea(dominant_colors)
                         st.download_button(
                             label="Download Photopea JSON",
                             data=photopea_data,
@@ -351,28 +440,30 @@ def main():
                 # Find matching pencils
                 st.subheader("✏️ Matching Colored Pencils")
                 
-                with st.spinner("Finding pencil matches..."):
-                    all_matches = []
-                    for color_info in dominant_colors:
-                        matches = st.session_state.color_matcher.find_matches(
-                            color_info['rgb'], max_matches=3
+                if 'matches' not in analysis_state:
+                    with st.spinner("Finding pencil matches..."):
+                        palette_result = color_matcher.match_palette(
+                            [color_info['rgb'] for color_info in dominant_colors], top_k=3
                         )
-                        all_matches.extend(matches)
+                        analysis_state['matches'] = palette_result['matches']
+                all_matches = analysis_state['matches']
                 
                 if all_matches:
-                    # Save pencil matches to database
-                    if analysis_id is not None:
+                    # Save pencil matches to database (once per analysis)
+                    if analysis_id is not None and not analysis_state.get('matches_saved'):
+                        analysis_state['matches_saved'] = True
                         try:
-                            st.session_state.db_manager.save_pencil_matches(
+                            db_manager.save_pencil_matches(
                                 analysis_id=analysis_id,
                                 session_id=st.session_state.session_id,
                                 matches=all_matches
                             )
                         except Exception as db_error:
+                            upload_state['warnings'].append(f"Could not save matches to database: {str(db_error)}")
                             st.warning(f"Could not save matches to database: {str(db_error)}")
                     
                     # Group by brand
-                    available_brands = st.session_state.pencil_db.get_available_brands()
+                    available_brands = pencil_db.get_available_brands()
                     brand_matches = {}
                     
                     for brand in available_brands:
@@ -389,7 +480,7 @@ def main():
                         for i, (brand, matches) in enumerate(brands_with_matches.items()):
                             with tabs[i]:
                                 display_pencil_matches(
-                                    matches, show_color_difference, st.session_state.pencil_db
+                                    matches, show_color_difference, pencil_db
                                 )
                     
                     # Summary statistics
@@ -429,7 +520,7 @@ def main():
                     
                     with shopping_cols[0]:
                         if st.button("📝 Text Shopping List"):
-                            shopping_text = st.session_state.palette_exporter.create_pencil_shopping_list(
+                            shopping_text = palette_exporter.create_pencil_shopping_list(
                                 all_matches, "text"
                             )
                             st.download_button(
@@ -441,7 +532,7 @@ def main():
                     
                     with shopping_cols[1]:
                         if st.button("📊 CSV Shopping List"):
-                            shopping_csv = st.session_state.palette_exporter.create_pencil_shopping_list(
+                            shopping_csv = palette_exporter.create_pencil_shopping_list(
                                 all_matches, "csv"
                             )
                             st.download_button(
@@ -453,7 +544,7 @@ def main():
                     
                     with shopping_cols[2]:
                         if st.button("📄 JSON Shopping List"):
-                            shopping_json = st.session_state.palette_exporter.create_pencil_shopping_list(
+                            shopping_json = palette_exporter.create_pencil_shopping_list(
                                 all_matches, "json"
                             )
                             st.download_button(
@@ -479,7 +570,7 @@ def main():
             st.subheader("📜 Your Analysis History")
             
             try:
-                history = st.session_state.db_manager.get_user_history(st.session_state.session_id)
+                history = db_manager.get_user_history(st.session_state.session_id)
                 
                 if history:
                     for item in history:
@@ -534,6 +625,29 @@ def main():
                 - Your analysis history is saved automatically
                 """)
 
+def get_upload_state(uploaded_file):
+    """
+    Get the pipeline state for the current upload, keyed by the file's content hash
+    
+    Each stage (decode, image row, analysis, matches) stores its result here the
+    first time it runs, so Streamlit reruns triggered by other widgets only re-render.
+    Only the most recent upload is kept per browser session.
+    """
+    file_bytes = uploaded_file.getvalue()
+    content_hash = hashlib.sha256(file_bytes).hexdigest()
+    
+    state = st.session_state.get('upload_state')
+    if state is None or state['content_hash'] != content_hash:
+        state = {
+            'content_hash': content_hash,
+            'file_bytes': file_bytes,
+            'analyses': {},  # num_colors -> stage results
+            'warnings': []
+        }
+        st.session_state.upload_state = state
+    
+    return state
+
 def get_brand_emoji(brand):
     """Get emoji for brand"""
     brand_emojis = {
@@ -0,0 +1,114 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+import numpy as np
+from PIL import Image
+from threadpoolctl import threadpool_limits
+import image_loader
+
+def share_pixels(array):
+    """
+    Copy a pixel array into a new shared memory block
+
+    Returns:
+        Tuple of (SharedMemory block, descriptor); the small (name, shape, dtype)
+        descriptor is all another process needs to attach to the block
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+def read_shared_pixels(descriptor):
+    """Copy the pixel array described by a share_pixels descriptor out of shared memory"""
+    name, shape, dtype = descriptor
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return np.array(np.ndarray(shape, dtype=dtype, buffer=block.buf))
+    finally:
+        block.close()
+
+# Analyzer each worker process runs its jobs with
+_worker_analyzer = None
+_worker_thread_limits = None
+
+def _init_worker(analyzer_class):
+    """Process pool initializer: one analyzer per worker, running single-threaded"""
+    global _worker_analyzer, _worker_thread_limits
+    _worker_analyzer = analyzer_class()
+    # The pool already uses one process per core; nested OpenMP / BLAS threads would oversubscribe it
+    _worker_thread_limits = threadpool_limits(limits=1)
+
+def _extract_job(num_colors, max_size, options, source=None, shared=None):
+    """Extract the colors of one image inside a worker process"""
+    try:
+        if shared is not None:
+            image = Image.fromarray(read_shared_pixels(shared))
+        else:
+            image = image_loader.load_image(source, max_size)
+    except Exception as e:
+        print(f"Error loading image for batch extraction: {str(e)}")
+        return []
+    return _worker_analyzer.extract_dominant_colors(image, num_colors, max_size, **options)
+
+def extract_many(analyzer, images, num_colors=8, max_size=300, max_workers=None, **options):
+    """
+    Extract dominant colors from many images in a pool of worker processes
+
+    Encoded images (bytes, file paths, binary file-like objects) are decoded by the
+    workers with image_loader.load_image. PIL images are downscaled here to the size
+    they are analyzed at and handed over through shared memory instead of being
+    pickled. At most two images per worker are in flight at a time, so memory stays
+    bounded however many images there are. Results are not cached.
+
+    Args:
+        analyzer: ColorAnalyzer whose class (and brightness range) the workers use
+        images: Iterable of PIL images, encoded image bytes, file paths or binary file-like objects
+        num_colors, max_size: As for ColorAnalyzer.extract_dominant_colors
+        max_workers: Number of worker processes (default: CPU count)
+        **options: Any other ColorAnalyzer.extract_palette argument (mode, engine, ...)
+
+    Yields:
+        List of color information for every image, in input order (empty if it failed)
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(type(analyzer),)) as executor:
+        try:
+            for image in images:
+                block = None
+                if isinstance(image, Image.Image):
+                    pixels = np.asarray(analyzer._prepare_image(image, max_size))
+                    block, shared = share_pixels(pixels)
+                    future = executor.submit(_extract_job, num_colors, max_size, options, shared=shared)
+                else:
+                    if hasattr(image, 'read'):
+                        # Open files cannot be pickled; their bytes can
+                        image = image.read()
+                    future = executor.submit(_extract_job, num_colors, max_size, options, source=image)
+                pending.append((future, block))
+
+                if len(pending) > 2 * max_workers:
+                    yield _finish_job(*pending.popleft())
+
+            while pending:
+                yield _finish_job(*pending.popleft())
+        finally:
+            # Stopped early (or failed): drop queued jobs and free the blocks once running ones are done
+            for future, _ in pending:
+                future.cancel()
+            wait([future for future, _ in pending])
+            for _, block in pending:
+                if block is not None:
+                    block.close()
+                    block.unlink()
+
+def _finish_job(future, block):
+    """Wait for one job and release its shared memory block"""
+    try:
+        return future.result()
+    finally:
+        if block is not None:
+            block.close()
+            block.unlink()
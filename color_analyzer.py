@@ -1,15 +1,58 @@
 import numpy as np
-from PIL import Image
-from sklearn.cluster import KMeans
+from PIL import Image, ImageSequence
 import colorsys
+import time
+from contextlib import contextmanager
+import color_space
+import superpixels
+import color_difference
+import quantizers
+import pixel_sampling
+from color_hierarchy import ColorHierarchy
+from strip_statistics import StripStatistics
+import image_loader
+import batch_extraction
+import extraction_profile
 
 class ColorAnalyzer:
     """Analyzes images to extract dominant colors using K-means clustering"""
     
-    def __init__(self):
-        pass
+    # Bump whenever extraction output changes so cached results are invalidated
+    ALGORITHM_VERSION = 2
     
-    def extract_dominant_colors(self, image, num_colors=8, max_size=300):
+    # Pixels with a mean channel value outside this range are ignored for clustering
+    MIN_BRIGHTNESS = 20
+    MAX_BRIGHTNESS = 235
+    
+    # 'pixels' clusters every pixel, 'histogram' clusters weighted distinct colors,
+    # 'hierarchy' cuts a per-image merge tree over a fine color codebook,
+    # 'superpixels' clusters the mean colors of SLIC superpixels weighted by area
+    EXTRACTION_MODES = ('pixels', 'histogram', 'hierarchy', 'superpixels')
+    
+    # Color spaces clustering can run in; 'lab' clusters perceptually, in float32
+    CLUSTER_SPACES = ('rgb', 'lab')
+    
+    # Deadline-bounded extraction starts from a sample of this many pixels and
+    # grows it by ANYTIME_GROWTH every round
+    ANYTIME_START_BUDGET = 4096
+    ANYTIME_GROWTH = 4
+    
+    # Shape regularity and refinement rounds of the 'superpixels' mode segmentation
+    SUPERPIXEL_COMPACTNESS = 10.0
+    SUPERPIXEL_ITERATIONS = 4
+    
+    def __init__(self, cache=None, compute_budget=None):
+        """
+        Args:
+            cache: Optional AnalysisCache for extraction results
+            compute_budget: Optional ComputeBudget; extractions that have to cluster pixels
+                (cache misses, except cuts of a cached hierarchy) then wait for a free slot
+                and run with capped OpenMP / BLAS threads
+        """
+        self.cache = cache
+        self.compute_budget = compute_budget
+    
+    def extract_dominant_colors(self, image, num_colors=8, max_size=300, **options):
         """
         Extract dominant colors from an image using K-means clustering
         
@@ -17,215 +60,1016 @@ class ColorAnalyzer:
             image: PIL Image object
             num_colors: Number of dominant colors to extract
             max_size: Maximum dimension to resize image to for faster processing
+            **options: Any other extract_palette argument (mode, engine, cluster_space, ...)
         
         Returns:
             List of dictionaries containing color information
         """
+        return self.extract_palette(image, num_colors, max_size, **options)['colors']
+    
+    def extract_many(self, images, num_colors=8, max_size=300, max_workers=None, **options):
+        """
+        Extract dominant colors from many images in parallel worker processes
+        
+        Encoded images are decoded by the workers; PIL images are downscaled here and
+        passed to them through shared memory (see batch_extraction.extract_many).
+        Results are not cached.
+        
+        Args:
+            images: Iterable of PIL images, encoded image bytes, file paths or binary file-like objects
+            num_colors: Number of dominant colors to extract per image
+            max_size: Maximum dimension to resize images to for faster processing
+            max_workers: Number of worker processes (default: CPU count)
+            **options: Any other extract_palette argument (mode, engine, cluster_space, ...)
+        
+        Yields:
+            List of color information for every image, in input order
+        """
+        return batch_extraction.extract_many(self, images, num_colors, max_size, max_workers, **options)
+    
+    def extract_palette(self, image, num_colors=8, max_size=300, mode='pixels', histogram_bits=6,
+                        engine='kmeans', hierarchy_size=64, cluster_space='rgb', sample_budget=None,
+                        sample_seed=0, deadline_ms=None, superpixel_size=8, profile=None):
+        """
+        Extract dominant colors together with the per-pixel cluster label map
+        
+        Args:
+            image: PIL Image object
+            num_colors: Number of dominant colors to extract
+            max_size: Maximum dimension to resize image to for faster processing
+            mode: 'pixels' clusters every pixel; 'histogram' clusters the distinct
+                colors weighted by their pixel counts (much cheaper fits); 'hierarchy'
+                builds a color hierarchy once per image (cached) and cuts it at num_colors,
+                so changing num_colors afterwards is nearly free; 'superpixels' segments the
+                image into superpixels of similar color and clusters their mean colors
+                weighted by area (far fewer points, less sensitive to noise and gradients)
+            histogram_bits: Bits kept per channel in 'histogram' mode (8 = exact colors,
+                5 or 6 merge near-identical colors into one bin)
+            engine: Quantizer engine, one of quantizers.QUANTIZERS ('kmeans', 'minibatch_kmeans',
+                'median_cut', 'octree' or 'pillow'); octree and median cut may return fewer colors
+            hierarchy_size: Codebook size the 'hierarchy' mode merges down from
+                (num_colors above it are capped)
+            cluster_space: 'rgb' clusters sRGB values; 'lab' converts the pixels to CIE Lab
+                once (float32) and clusters there, matching the Lab Delta E used for pencil
+                matching (not supported by the octree and pillow engines). Colors are
+                reported as RGB / hex either way.
+            sample_budget: If set, cluster only this many pixels, drawn by stratified spatial
+                sampling of the downscaled image ('pixels' and 'histogram' modes), so cost no
+                longer depends on the aspect ratio. Every color then also reports
+                'percentage_error', the 95% sampling error of its percentage in points.
+            sample_seed: Random seed of the sample (same seed, same result)
+            deadline_ms: If set, cluster progressively larger stratified samples ('pixels' and
+                'histogram' modes) and stop once the next one, followed by labelling every pixel
+                and analyzing locations, is not expected to finish within this many milliseconds
+                of the call, keeping the palette of the largest sample done so far. Time spent
+                waiting for a compute slot, converting and downscaling counts. This is a target
+                rather than a hard limit: conversion, downscaling, the smallest sample and the
+                final labelling always run, so a large input image or max_size can overrun it
+                (downscale images first to stay within it). Unfinished palettes report
+                'percentage_error' and are not cached.
+            superpixel_size: Approximate superpixel width in pixels in 'superpixels' mode
+            profile: Optional ExtractionProfile to fill in with the parameters, the total time
+                and the time and sizes of every stage (cache lookup, queueing for a compute slot,
+                convert, resize, brightness filter, fit, predict, location analysis, ...)
+        
+        Returns:
+            Dictionary with 'colors' (list of color information, most dominant first) and
+            'label_map' (integer array of the downscaled image's shape holding each pixel's
+            index into 'colors'; None if extraction failed). With deadline_ms it also holds
+            'converged': True if every pixel (or all of sample_budget) was clustered in time.
+        """
+        start = time.perf_counter()
+        deadline = None if deadline_ms is None else start + deadline_ms / 1000
+        if mode not in self.EXTRACTION_MODES:
+            raise ValueError(f"Unknown extraction mode '{mode}', expected one of {self.EXTRACTION_MODES}")
+        self._check_engine(engine, cluster_space)
+        if sample_budget is not None:
+            if mode not in ('pixels', 'histogram'):
+                raise ValueError("sample_budget is supported in 'pixels' and 'histogram' modes")
+            if sample_budget < num_colors:
+                raise ValueError(f"sample_budget ({sample_budget}) must be at least num_colors ({num_colors})")
+        if deadline_ms is not None and mode not in ('pixels', 'histogram'):
+            raise ValueError("deadline_ms is supported in 'pixels' and 'histogram' modes")
+        
+        options = {'mode': mode, 'histogram_bits': histogram_bits, 'engine': engine, 'cluster_space': cluster_space}
+        if mode == 'hierarchy':
+            options['hierarchy_size'] = hierarchy_size
+        if mode == 'superpixels':
+            options['superpixel_size'] = superpixel_size
+        if sample_budget is not None:
+            options['sample_budget'] = sample_budget
+            options['sample_seed'] = sample_seed
+        if profile is not None:
+            profile.parameters = dict(options, num_colors=num_colors, max_size=max_size)
+        
+        if self.cache is None:
+            palette = self._extract_palette(image, num_colors, max_size, options, deadline=deadline, profile=profile)
+        else:
+            with extraction_profile.stage(profile, 'cache_lookup') as entry:
+                image_digest = self.cache.image_digest(image)
+                cache_key = self.cache.make_key(
+                    image_digest,
+                    num_colors=num_colors,
+                    max_size=max_size,
+                    brightness_range=(self.MIN_BRIGHTNESS, self.MAX_BRIGHTNESS),
+                    version=self.ALGORITHM_VERSION,
+                    **options
+                )
+                palette = self.cache.get(cache_key)
+                entry['hit'] = palette is not None
+            if palette is None:
+                palette = self._extract_palette(image, num_colors, max_size, options, image_digest, deadline, profile)
+                # Only complete palettes are cached; they are the same with or without a deadline
+                if palette['colors'] and palette.get('converged', True):
+                    self.cache.set(cache_key, {key: value for key, value in palette.items() if key != 'converged'})
+            elif deadline is not None:
+                palette['converged'] = True
+        
+        if profile is not None:
+            profile.total_seconds = time.perf_counter() - start
+        return palette
+    
+    def _extract_palette(self, image, num_colors, max_size, options, image_digest=None, deadline=None,
+                         profile=None):
+        """
+        Run the extraction pipeline for extract_palette (without caching the palette itself)
+        
+        Work that clusters pixels runs in a compute slot (see ComputeBudget); in 'hierarchy'
+        mode only building the hierarchy does, not cutting it.
+        """
         try:
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Resize image for faster processing
-            original_size = image.size
-            if max(original_size) > max_size:
-                ratio = max_size / max(original_size)
-                new_size = (int(original_size[0] * ratio), int(original_size[1] * ratio))
-                try:
-                    # Use LANCZOS for newer Pillow versions, fallback to BICUBIC for older versions
-                    image = image.resize(new_size, Image.Resampling.LANCZOS)
-                except AttributeError:
-                    # Fallback for older Pillow versions
-                    try:
-                        from PIL.Image import Resampling
-                        image = image.resize(new_size, Resampling.LANCZOS)
-                    except (AttributeError, ImportError):
-                        image = image.resize(new_size)
-            
-            # Convert image to numpy array
-            img_array = np.array(image)
-            
-            # Reshape to list of pixels
-            pixels = img_array.reshape(-1, 3)
-            
-            # Remove very dark and very light pixels (optional preprocessing)
-            # This helps focus on meaningful colors
-            brightness = np.mean(pixels, axis=1)
-            mask = (brightness > 20) & (brightness < 235)
-            filtered_pixels = pixels[mask]
-            
-            if len(filtered_pixels) < num_colors:
-                # If too few pixels after filtering, use all pixels
-                filtered_pixels = pixels
-            
-            # Apply K-means clustering
-            kmeans = KMeans(n_clusters=num_colors, random_state=42, n_init='auto')
-            kmeans.fit(filtered_pixels)
+            if options['mode'] == 'hierarchy':
+                hierarchy = self._get_hierarchy(image, max_size, options, image_digest, profile)
+                with extraction_profile.stage(profile, 'cut', num_colors=num_colors):
+                    return self._cut_hierarchy(hierarchy, num_colors)
             
-            # Get cluster centers (dominant colors)
-            colors = kmeans.cluster_centers_.astype(int)
+            # Only the heavy work queues for a compute slot; cutting a cached hierarchy does not
+            with self._compute_slot(profile):
+                return self._extract_pixel_palette(image, num_colors, max_size, options, deadline, profile)
             
-            # For location analysis, we need to predict labels for ALL pixels
-            all_labels = kmeans.predict(pixels)
-            
-            # Calculate the percentage of each color using filtered pixels
-            filtered_labels = kmeans.labels_
-            total_pixels = len(filtered_labels) if filtered_labels is not None else 0
-            
-            color_info = []
-            for i, color in enumerate(colors):
-                # Count pixels in this cluster (from filtered pixels for percentage)
-                count = np.sum(filtered_labels == i)
-                percentage = (count / total_pixels) * 100
+        except Exception as e:
+            print(f"Error in color extraction: {str(e)}")
+            palette = {'colors': [], 'label_map': None}
+            if deadline is not None:
+                palette['converged'] = False
+            return palette
+    
+    def _extract_pixel_palette(self, image, num_colors, max_size, options, deadline=None, profile=None):
+        """Extraction pipeline of the modes that cluster the image itself (all but 'hierarchy')"""
+        image = self._prepare_image(image, max_size, profile)
+        
+        # Convert image to numpy array
+        img_array = np.array(image)
+        
+        # Reshape to list of pixels
+        pixels = img_array.reshape(-1, 3)
+        
+        # Remove very dark and very light pixels (optional preprocessing)
+        # This helps focus on meaningful colors
+        with extraction_profile.stage(profile, 'brightness_filter', pixels=len(pixels)) as entry:
+            mask = self._brightness_mask(pixels)
+            entry['kept'] = int(mask.sum())
+        
+        if options['mode'] == 'superpixels':
+            return self._superpixel_palette(img_array, mask, num_colors, options, profile)
+        
+        errors = None
+        if deadline is not None:
+            colors, counts, all_labels, errors, converged = self._cluster_anytime(
+                pixels, mask, num_colors, options, img_array.shape[:2], deadline, profile
+            )
+        elif 'sample_budget' in options:
+            colors, counts, all_labels, errors = self._cluster_sample(
+                pixels, mask, num_colors, options, img_array.shape[:2], profile
+            )
+        else:
+            colors, counts, all_labels = self._cluster(pixels, mask, num_colors, options, profile)
+        label_image = all_labels.reshape(img_array.shape[:2])
+        
+        with extraction_profile.stage(profile, 'locations', pixels=len(pixels), clusters=len(colors)):
+            locations = self._analyze_color_locations(img_array, all_labels, len(colors))
+        palette = self._build_palette(colors, counts, locations, label_image, errors)
+        if deadline is not None:
+            palette['converged'] = converged
+        return palette
+    
+    def extract_dominant_colors_streaming(self, source, num_colors=8, histogram_bits=6, engine='kmeans',
+                                          cluster_space='rgb', spatial_bits=4, bands=60,
+                                          max_strip_pixels=1 << 18, max_decode_pixels=1 << 24):
+        """
+        Extract dominant colors from a very large image with bounded memory
+        
+        The image is read in horizontal strips (see image_loader.iter_strips) and only
+        fixed-size aggregates are kept (see StripStatistics): the histogram-weighted colors
+        are clustered like mode='histogram', and location analysis runs on per-band row /
+        column profiles instead of a label map. Results are not cached.
+        
+        Memory is bounded by the strip size only for uncompressed images stored as a single
+        raw tile (plain TIFF, BMP, PPM), which are read at full resolution straight from the
+        file. Pillow cannot decode other formats partially, so they are decoded whole, up to
+        max_decode_pixels: larger JPEGs are decoded at a reduced DCT scale (1/2 to 1/8) that
+        fits, larger PNGs, compressed TIFFs etc. are rejected (an error is printed and an
+        empty list returned) rather than decoded in full.
+        
+        Args:
+            source: Encoded image bytes, a file path, a binary file-like object or an
+                image from image_loader.open_image that has not been loaded yet
+            num_colors: Number of dominant colors to extract
+            histogram_bits: Bits kept per channel in the clustered histogram
+            engine: Quantizer engine, one of quantizers.QUANTIZERS
+            cluster_space: 'rgb' or 'lab', as for extract_palette
+            spatial_bits: Bits per channel of the histogram the band profiles are kept for
+            bands: Number of horizontal and vertical bands used for location analysis
+            max_strip_pixels: Upper bound on the pixels decoded into one strip
+            max_decode_pixels: Upper bound on the pixels decoded whole for formats that
+                cannot be streamed (default 16.7M, about 50 MB of RGB)
+        
+        Returns:
+            List of dictionaries containing color information
+        """
+        self._check_engine(engine, cluster_space)
+        
+        with self._compute_slot():
+            try:
+                image = image_loader.open_image(source) if not hasattr(source, 'size') else source
+                # Applied before sizing the statistics, since a JPEG draft scale shrinks the image
+                image = image_loader.bound_decode_size(image, max_decode_pixels)
+                stats = StripStatistics(image.size[0], image.size[1], histogram_bits, spatial_bits, bands)
+                for top, strip in image_loader.iter_strips(image, max_strip_pixels):
+                    stats.add_strip(top, strip, self._brightness_mask(strip.reshape(-1, 3)))
                 
-                # Convert to hex
-                hex_color = "#{:02x}{:02x}{:02x}".format(color[0], color[1], color[2])
+                return self._palette_from_statistics(stats, num_colors, engine, cluster_space)
                 
-                # Calculate additional color properties
-                hsv = colorsys.rgb_to_hsv(color[0]/255, color[1]/255, color[2]/255)
+            except Exception as e:
+                print(f"Error in streaming color extraction: {str(e)}")
+                return []
+    
+    def extract_frame_palettes(self, source, num_colors=8, max_size=300, histogram_bits=6, engine='kmeans',
+                               cluster_space='rgb', spatial_bits=4, bands=60, frame_palettes=True):
+        """
+        Extract dominant colors from every frame of an animated or multi-page image
+        
+        Frames (GIF, APNG, WebP, multi-page TIFF, ...) are decoded one at a time with
+        ImageSequence, downscaled and summarized into fixed-size statistics (see
+        StripStatistics) that are added to a running total and then dropped, so memory
+        does not grow with the number of frames. The overall palette clusters the
+        running histogram like mode='histogram'; every frame can also get its own
+        palette from its own histogram. Results are not cached.
+        
+        Args:
+            source: Encoded image bytes, a file path, a binary file-like object or an
+                image from image_loader.open_image
+            num_colors: Number of dominant colors to extract (overall and per frame)
+            max_size: Maximum dimension frames are resized to for faster processing
+            histogram_bits: Bits kept per channel in the clustered histograms
+            engine: Quantizer engine, one of quantizers.QUANTIZERS
+            cluster_space: 'rgb' or 'lab', as for extract_palette
+            spatial_bits: Bits per channel of the histogram the band profiles are kept for
+            bands: Number of horizontal and vertical bands used for location analysis
+            frame_palettes: Whether to extract a palette for every frame as well
+        
+        Returns:
+            Dictionary with 'colors' (color information over all frames), 'num_frames' and
+            'frames' (per frame: 'index', 'duration' in ms if the format has one and
+            'colors'; empty if frame_palettes is False)
+        """
+        self._check_engine(engine, cluster_space)
+        
+        with self._compute_slot():
+            try:
+                image = image_loader.open_image(source) if not hasattr(source, 'size') else source
+                total = None
+                frames = []
+                for index, frame in enumerate(ImageSequence.Iterator(image)):
+                    frame_array = np.array(self._prepare_image(frame, max_size))
+                    stats = StripStatistics(frame_array.shape[1], frame_array.shape[0], histogram_bits,
+                                            spatial_bits, bands)
+                    stats.add_strip(0, frame_array, self._brightness_mask(frame_array.reshape(-1, 3)))
+                    
+                    if frame_palettes:
+                        frames.append({
+                            'index': index,
+                            'duration': frame.info.get('duration'),
+                            'colors': self._palette_from_statistics(stats, num_colors, engine, cluster_space)
+                        })
+                    
+                    if total is None:
+                        total = stats
+                    else:
+                        total.merge(stats)
                 
-                # Analyze where this color appears in the image using all pixels
-                location_info = self._analyze_color_location(img_array, all_labels, i, color)
+                return {
+                    'colors': self._palette_from_statistics(total, num_colors, engine, cluster_space),
+                    'num_frames': index + 1,
+                    'frames': frames
+                }
                 
-                color_info.append({
-                    'rgb': tuple(color),
-                    'hex': hex_color,
-                    'percentage': percentage,
-                    'hsv': hsv,
-                    'brightness': np.mean(color),
-                    'location_info': location_info
-                })
+            except Exception as e:
+                print(f"Error in frame color extraction: {str(e)}")
+                return {'colors': [], 'num_frames': 0, 'frames': []}
+    
+    def _palette_from_statistics(self, stats, num_colors, engine, cluster_space):
+        """Cluster the histogram of a StripStatistics and build the color information list"""
+        # Each occupied bin is represented by the mean color of its pixels
+        occupied = np.flatnonzero(stats.counts)
+        bin_colors = stats.sums[occupied] / stats.counts[occupied][:, None]
+        
+        weights = stats.filtered_counts[occupied].astype(np.float64)
+        if weights.sum() < num_colors:
+            # If too few pixels after filtering, use all pixels
+            weights = stats.counts[occupied].astype(np.float64)
+        fit_rows = np.flatnonzero(weights > 0)
+        
+        quantizer = quantizers.get_quantizer(engine)
+        points = self._to_cluster_space(bin_colors, cluster_space)
+        centers, _ = quantizer.fit(
+            points[fit_rows], min(num_colors, len(fit_rows)), sample_weight=weights[fit_rows]
+        )
+        colors = self._centers_to_rgb(centers, cluster_space)
+        bin_labels = quantizer.predict(points, centers)
+        counts = np.bincount(bin_labels, weights=weights, minlength=len(colors))
+        
+        # Every coarse spatial bin goes to the cluster most of its pixels belong to
+        spatial_bins = stats.spatial_bins(occupied)
+        votes = np.bincount(
+            spatial_bins * len(colors) + bin_labels, weights=stats.counts[occupied],
+            minlength=len(stats.row_counts) * len(colors)
+        ).reshape(len(stats.row_counts), len(colors))
+        spatial_clusters = np.argmax(votes, axis=1)
+        
+        row_counts = np.zeros((len(colors), stats.row_bands), dtype=np.int64)
+        col_counts = np.zeros((len(colors), stats.col_bands), dtype=np.int64)
+        np.add.at(row_counts, spatial_clusters, stats.row_counts)
+        np.add.at(col_counts, spatial_clusters, stats.col_counts)
+        
+        locations = self._locations_from_profiles(row_counts, col_counts)
+        return self._build_color_info(colors, counts, locations, self._dominance_order(counts))
+        
+
+    def _cluster_sample(self, pixels, mask, num_colors, options, shape, profile=None):
+        """
+        Cluster a stratified sample of the pixels, then label every pixel through a color lookup
+        
+        Returns:
+            Tuple of (cluster colors as ints, sampled filtered pixel count per cluster,
+            label of every pixel, sampling error of every cluster's percentage)
+        """
+        with extraction_profile.stage(profile, 'sample', budget=options['sample_budget']):
+            sample = pixel_sampling.stratified_sample(shape[0], shape[1], options['sample_budget'], options['sample_seed'])
+        colors, counts, _ = self._cluster(pixels[sample], mask[sample], num_colors, options, profile)
+        return (colors, counts) + self._label_sample(pixels, mask, sample, colors, counts, options, profile)
+    
+    def _label_sample(self, pixels, mask, sample, colors, counts, options, profile=None):
+        """Label every pixel with the colors clustered from a sample; returns (labels, percentage errors)"""
+        space = options.get('cluster_space', 'rgb')
+        with extraction_profile.stage(profile, 'predict', pixels=len(pixels)):
+            all_labels = quantizers.assign_labels(
+                pixels, self._to_cluster_space(colors, space), quantizers.get_quantizer(options['engine']),
+                transform=lambda colors: self._to_cluster_space(colors, space)
+            )
+        
+        # Percentages come from the filtered sample (or the whole sample if too few pixels passed the filter)
+        sample_size = np.sum(counts)
+        population = np.sum(mask) if sample_size == np.sum(mask[sample]) else len(pixels)
+        errors = pixel_sampling.percentage_error(counts / sample_size * 100, sample_size, population)
+        
+        return all_labels, errors
+    
+    def _cluster_anytime(self, pixels, mask, num_colors, options, shape, deadline, profile=None):
+        """
+        Cluster progressively larger stratified samples until all pixels are done or time runs out
+        
+        A round's cost is predicted from the previous one, scaled by the sample growth
+        (clustering cost is roughly linear in the number of pixels). The work that follows
+        the last round, labelling every pixel and analyzing locations, is reserved as well:
+        it is timed on each round's sample and scaled to the whole image.
+        
+        Returns:
+            Tuple of (cluster colors as ints, filtered pixel count per cluster, label of every
+            pixel, percentage errors or None if every pixel was clustered, converged flag)
+        """
+        limit = min(options.get('sample_budget', len(pixels)), len(pixels))
+        budget = min(limit, max(num_colors, self.ANYTIME_START_BUDGET))
+        sample_seed = options.get('sample_seed', 0)
+        
+        while True:
+            start = time.perf_counter()
+            if budget == len(pixels):
+                colors, counts, all_labels = self._cluster(pixels, mask, num_colors, options, profile)
+                return colors, counts, all_labels, None, True
             
-            # Sort by percentage (most dominant first)
-            color_info.sort(key=lambda x: x['percentage'], reverse=True)
+            with extraction_profile.stage(profile, 'sample', budget=budget):
+                sample = pixel_sampling.stratified_sample(shape[0], shape[1], budget, sample_seed)
+            colors, counts, _ = self._cluster(pixels[sample], mask[sample], num_colors, options, profile)
+            finished = time.perf_counter()
+            finish_seconds = self._predict_finish_seconds(pixels, sample, colors, options)
             
-            return color_info
+            next_budget = min(limit, budget * self.ANYTIME_GROWTH)
+            converged = budget == limit
+            if converged or finished + (finished - start) * next_budget / budget + finish_seconds > deadline:
+                break
+            budget = next_budget
+        
+        all_labels, errors = self._label_sample(pixels, mask, sample, colors, counts, options, profile)
+        return colors, counts, all_labels, errors, converged
+    
+    def _predict_finish_seconds(self, pixels, sample, colors, options):
+        """Predicted time of labelling every pixel and analyzing locations, timed on a sample and scaled up"""
+        start = time.perf_counter()
+        space = options.get('cluster_space', 'rgb')
+        labels = quantizers.assign_labels(
+            pixels[sample], self._to_cluster_space(colors, space), quantizers.get_quantizer(options['engine']),
+            transform=lambda colors: self._to_cluster_space(colors, space)
+        )
+        self._location_profiles(labels.reshape(1, -1), len(colors))
+        return (time.perf_counter() - start) * len(pixels) / len(sample)
+    
+    def _build_palette(self, colors, counts, locations, label_image, errors=None):
+        """Build the extract_palette result, with labels renumbered to index the sorted color list"""
+        order = self._dominance_order(counts)
+        
+        rank = np.empty(len(order), dtype=np.min_scalar_type(len(order)))
+        rank[order] = np.arange(len(order))
+        
+        return {
+            'colors': self._build_color_info(colors, counts, locations, order, errors),
+            'label_map': rank[label_image]
+        }
+    
+    def _get_hierarchy(self, image, max_size, options, image_digest=None, profile=None):
+        """Get the ColorHierarchy of an image from the cache, building (and caching) it if needed"""
+        if self.cache is None:
+            with self._compute_slot(profile):
+                return self._build_hierarchy(image, max_size, options, profile)
+        
+        cache_key = self.cache.make_key(
+            image_digest or self.cache.image_digest(image),
+            structure='hierarchy',
+            max_size=max_size,
+            brightness_range=(self.MIN_BRIGHTNESS, self.MAX_BRIGHTNESS),
+            version=self.ALGORITHM_VERSION,
+            **options
+        )
+        with extraction_profile.stage(profile, 'hierarchy_lookup') as entry:
+            hierarchy = self.cache.get(cache_key)
+            entry['hit'] = hierarchy is not None
+        if hierarchy is None:
+            with self._compute_slot(profile):
+                hierarchy = self._build_hierarchy(image, max_size, options, profile)
+            self.cache.set(cache_key, hierarchy)
+        
+        return hierarchy
+    
+    def _build_hierarchy(self, image, max_size, options, profile=None):
+        """
+        Cluster the image into a fine codebook (hierarchy_size colors, histogram-weighted)
+        and build the merge tree over it
+        """
+        img_array = np.array(self._prepare_image(image, max_size, profile))
+        pixels = img_array.reshape(-1, 3)
+        with extraction_profile.stage(profile, 'brightness_filter', pixels=len(pixels)) as entry:
+            mask = self._brightness_mask(pixels)
+            entry['kept'] = int(mask.sum())
+        
+        keys = (pixels[:, 0].astype(np.int32) << 16) | (pixels[:, 1].astype(np.int32) << 8) | pixels[:, 2]
+        size = min(options['hierarchy_size'], len(np.unique(keys)))
+        
+        codebook_options = dict(options, mode='histogram')
+        codebook, _, code_labels = self._cluster(pixels, mask, size, codebook_options, profile)
+        size = len(codebook)
+        
+        # Weights and mean colors from the same pixels the codebook was fit on
+        fit_mask = mask if mask.sum() >= size else np.ones(len(pixels), dtype=bool)
+        code_counts = np.bincount(code_labels[fit_mask], minlength=size)
+        code_sums = np.stack([
+            np.bincount(code_labels[fit_mask], weights=pixels[fit_mask, c], minlength=size) for c in range(3)
+        ], axis=1)
+        code_colors = np.where(
+            code_counts[:, None] > 0, code_sums / np.maximum(code_counts, 1)[:, None], codebook
+        )
+        
+        label_image = code_labels.reshape(img_array.shape[:2]).astype(np.min_scalar_type(size))
+        with extraction_profile.stage(profile, 'locations', pixels=len(pixels), clusters=size):
+            row_counts, col_counts = self._location_profiles(label_image, size)
+        
+        with extraction_profile.stage(profile, 'merge_tree', codes=size):
+            return ColorHierarchy(label_image, code_counts, code_colors, row_counts, col_counts)
+    
+    def _cut_hierarchy(self, hierarchy, num_colors):
+        """Build a palette from a ColorHierarchy cut at num_colors, without touching the pixels"""
+        code_clusters = hierarchy.cut(num_colors)
+        num_clusters = int(code_clusters.max()) + 1
+        
+        counts = np.bincount(code_clusters, weights=hierarchy.code_counts, minlength=num_clusters)
+        sums = np.stack([
+            np.bincount(code_clusters, weights=hierarchy.code_counts * hierarchy.code_colors[:, c],
+                        minlength=num_clusters)
+            for c in range(3)
+        ], axis=1)
+        means = np.stack([
+            np.bincount(code_clusters, weights=hierarchy.code_colors[:, c], minlength=num_clusters)
+            for c in range(3)
+        ], axis=1) / np.bincount(code_clusters, minlength=num_clusters)[:, None]
+        colors = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1e-12)[:, None], means).astype(int)
+        
+        # A cluster's row / column profile is the sum of its codes' profiles
+        row_counts = np.zeros((num_clusters, hierarchy.row_counts.shape[1]), dtype=hierarchy.row_counts.dtype)
+        col_counts = np.zeros((num_clusters, hierarchy.col_counts.shape[1]), dtype=hierarchy.col_counts.dtype)
+        np.add.at(row_counts, code_clusters, hierarchy.row_counts)
+        np.add.at(col_counts, code_clusters, hierarchy.col_counts)
+        
+        locations = self._locations_from_profiles(row_counts, col_counts)
+        return self._build_palette(colors, counts, locations, code_clusters[hierarchy.code_labels])
+    
+    def _cluster(self, pixels, mask, num_colors, options, profile=None):
+        """Cluster pixels with the mode and quantizer engine selected in options"""
+        quantizer = quantizers.get_quantizer(options['engine'])
+        space = options.get('cluster_space', 'rgb')
+        if options['mode'] == 'histogram':
+            return self._cluster_histogram(pixels, mask, num_colors, options['histogram_bits'], quantizer, space,
+                                           profile)
+        return self._cluster_pixels(pixels, mask, num_colors, quantizer, space, profile)
+    
+    @contextmanager
+    def _compute_slot(self, profile=None):
+        """Context that runs heavy work within the compute budget (if any), recording the wait as 'queue'"""
+        if self.compute_budget is None:
+            yield
+            return
+        queued = time.perf_counter()
+        with self.compute_budget.limit():
+            if profile is not None:
+                profile.add('queue', time.perf_counter() - queued)
+            yield
+    
+    def _check_engine(self, engine, cluster_space):
+        """Validate a quantizer engine / cluster space combination"""
+        if engine not in quantizers.QUANTIZERS:
+            raise ValueError(f"Unknown quantizer engine '{engine}', expected one of {tuple(quantizers.QUANTIZERS)}")
+        if cluster_space not in self.CLUSTER_SPACES:
+            raise ValueError(f"Unknown cluster space '{cluster_space}', expected one of {self.CLUSTER_SPACES}")
+        if cluster_space != 'rgb' and quantizers.QUANTIZERS[engine].rgb_only:
+            raise ValueError(f"Quantizer engine '{engine}' can only cluster in 'rgb'")
+    
+    def _to_cluster_space(self, colors, space):
+        """Convert an (N, 3) RGB buffer to the space clustering runs in (Lab is float32)"""
+        if space == 'lab':
+            return color_space.rgb_to_lab(colors)
+        return colors
+    
+    def _centers_to_rgb(self, centers, space):
+        """Cluster centers as integer RGB colors"""
+        if space == 'lab':
+            return np.rint(color_space.lab_to_rgb(centers)).astype(int)
+        return centers.astype(int)
+    
+    def benchmark_quantizers(self, image, num_colors=8, max_size=300, mode='pixels', histogram_bits=6,
+                             engines=None, repeats=3, cluster_space='rgb'):
+        """
+        Time the quantizer engines against each other on the same prepared pixels (bypasses the cache)
+        
+        Args:
+            image: PIL Image object
+            num_colors, max_size, mode, histogram_bits: As for extract_dominant_colors
+            engines: Engine names to compare (default: all of quantizers.QUANTIZERS that
+                support cluster_space)
+            repeats: Runs per engine; the fastest one is reported
+            cluster_space: 'rgb' or 'lab', as for extract_palette
+        
+        Returns:
+            List of dictionaries with 'engine', 'seconds' (best clustering time), 'num_colors',
+            'mean_error' (mean RGB distance of the filtered pixels to their cluster color)
+            and 'color_info'
+        """
+        if mode not in ('pixels', 'histogram'):
+            raise ValueError(f"benchmark_quantizers compares 'pixels' or 'histogram' extraction, not '{mode}'")
+        
+        img_array = np.array(self._prepare_image(image, max_size))
+        pixels = img_array.reshape(-1, 3)
+        mask = self._brightness_mask(pixels)
+        if mask.sum() < num_colors:
+            mask = np.ones(len(pixels), dtype=bool)
+        
+        if engines is None:
+            engines = [name for name, engine in quantizers.QUANTIZERS.items()
+                       if cluster_space == 'rgb' or not engine.rgb_only]
+        for engine in engines:
+            self._check_engine(engine, cluster_space)
+        
+        results = []
+        for engine in engines:
+            options = {'mode': mode, 'histogram_bits': histogram_bits, 'engine': engine,
+                       'cluster_space': cluster_space}
+            best = None
+            for _ in range(max(1, repeats)):
+                start = time.perf_counter()
+                colors, counts, all_labels = self._cluster(pixels, mask, num_colors, options)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
             
-        except Exception as e:
-            print(f"Error in color extraction: {str(e)}")
-            return []
+            errors = np.linalg.norm(pixels[mask] - colors[all_labels[mask]], axis=1)
+            results.append({
+                'engine': engine,
+                'seconds': best,
+                'num_colors': len(colors),
+                'mean_error': float(errors.mean()),
+                'color_info': self._build_color_info(
+                    colors, counts, self._analyze_color_locations(img_array, all_labels, len(colors)),
+                    self._dominance_order(counts)
+                )
+            })
+        
+        return results
     
-    def rgb_to_lab(self, rgb):
+    def _prepare_image(self, image, max_size, profile=None):
+        """Convert an image to RGB and downscale it so its longest side is at most max_size"""
+        # Convert to RGB if necessary
+        with extraction_profile.stage(profile, 'convert', mode=image.mode, pixels=image.size[0] * image.size[1]):
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+        
+        with extraction_profile.stage(profile, 'resize', from_size=list(image.size)) as entry:
+            image = self._resize_image(image, max_size)
+            entry['to_size'] = list(image.size)
+        
+        return image
+    
+    def _resize_image(self, image, max_size):
+        """Downscale an image so its longest side is at most max_size"""
+        # Resize image for faster processing
+        original_size = image.size
+        if max(original_size) > max_size:
+            ratio = max_size / max(original_size)
+            new_size = (int(original_size[0] * ratio), int(original_size[1] * ratio))
+            try:
+                # Use LANCZOS for newer Pillow versions, fallback to BICUBIC for older versions
+                image = image.resize(new_size, Image.Resampling.LANCZOS)
+            except AttributeError:
+                # Fallback for older Pillow versions
+                try:
+                    from PIL.Image import Resampling
+                    image = image.resize(new_size, Resampling.LANCZOS)
+                except (AttributeError, ImportError):
+                    image = image.resize(new_size)
+        
+        return image
+    
+    def _brightness_mask(self, pixels):
+        """Mask of pixels that are neither very dark nor very light"""
+        brightness = np.mean(pixels, axis=1)
+        return (brightness > self.MIN_BRIGHTNESS) & (brightness < self.MAX_BRIGHTNESS)
+    
+    def _cluster_pixels(self, pixels, mask, num_colors, quantizer, space='rgb', profile=None):
         """
-        Convert RGB to LAB color space for better color distance calculations
+        Cluster the (filtered) pixels directly
+        
+        In 'lab' space the whole pixel buffer is converted once (float32) and clustered there.
+        
+        Returns:
+            Tuple of (cluster colors as ints, filtered pixel count per cluster, label of every pixel)
+        """
+        points = self._to_cluster_space(pixels, space)
+        filtered_pixels = points[mask]
+        
+        if len(filtered_pixels) < num_colors:
+            # If too few pixels after filtering, use all pixels
+            filtered_pixels = points
+        
+        # Quantize (K-means by default)
+        with extraction_profile.stage(profile, 'fit', engine=quantizer.name, points=len(filtered_pixels),
+                                      num_colors=num_colors) as entry:
+            centers, fit_labels = quantizer.fit(filtered_pixels, num_colors)
+            entry.update(iterations=quantizer.n_iter, inertia=quantizer.inertia)
+        
+        # Get cluster centers (dominant colors)
+        colors = self._centers_to_rgb(centers, space)
+        
+        # For location analysis we need labels for ALL pixels: reuse the fit labels and
+        # label only the excluded (very dark / very light) pixels through a color lookup
+        if len(filtered_pixels) == len(pixels):
+            all_labels = fit_labels
+        else:
+            with extraction_profile.stage(profile, 'predict', pixels=int(len(pixels) - mask.sum())):
+                all_labels = np.empty(len(pixels), dtype=np.intp)
+                all_labels[mask] = fit_labels
+                all_labels[~mask] = quantizers.assign_labels(
+                    pixels[~mask], centers, quantizer, transform=lambda colors: self._to_cluster_space(colors, space)
+                )
+        
+        # Count pixels in each cluster (from filtered pixels for percentage)
+        counts = np.bincount(fit_labels, minlength=len(colors))
+        
+        return colors, counts, all_labels
+    
+    def _cluster_histogram(self, pixels, mask, num_colors, bits, quantizer, space='rgb', profile=None):
         """
-        # Normalize RGB values
-        rgb = np.array(rgb) / 255.0
+        Cluster the distinct colors of the image, weighted by how many pixels have them
+        
+        With 8 bits per channel every distinct color is kept (np.unique on 24-bit keys);
+        with fewer bits pixels are binned with np.bincount and each bin is represented
+        by the mean color of its pixels.
         
-        # Apply gamma correction
-        rgb = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+        Returns:
+            Tuple of (cluster colors as ints, filtered pixel count per cluster, label of every pixel)
+        """
+        with extraction_profile.stage(profile, 'histogram', pixels=len(pixels), bits=bits) as entry:
+            if bits >= 8:
+                keys = (pixels[:, 0].astype(np.int32) << 16) | (pixels[:, 1].astype(np.int32) << 8) | pixels[:, 2]
+                unique_keys, inverse = np.unique(keys, return_inverse=True)
+                unique_colors = np.stack(
+                    [(unique_keys >> 16) & 0xFF, (unique_keys >> 8) & 0xFF, unique_keys & 0xFF], axis=1
+                ).astype(np.float64)
+            else:
+                quantized = (pixels >> (8 - bits)).astype(np.intp)
+                keys = (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+                bin_counts = np.bincount(keys, minlength=1 << (3 * bits))
+                occupied = np.flatnonzero(bin_counts)
+                remap = np.zeros(len(bin_counts), dtype=np.intp)
+                remap[occupied] = np.arange(len(occupied))
+                inverse = remap[keys]
+                unique_colors = np.stack([
+                    np.bincount(inverse, weights=pixels[:, c], minlength=len(occupied)) for c in range(3)
+                ], axis=1) / bin_counts[occupied][:, None]
+            inverse = inverse.reshape(-1)
+            entry['colors'] = len(unique_colors)
         
-        # Convert to XYZ
-        xyz_matrix = np.array([
-            [0.4124564, 0.3575761, 0.1804375],
-            [0.2126729, 0.7151522, 0.0721750],
-            [0.0193339, 0.1191920, 0.9503041]
-        ])
+        # Filtered pixel count of every distinct color
+        weights = np.bincount(inverse, weights=mask, minlength=len(unique_colors))
+        if weights.sum() < num_colors:
+            # If too few pixels after filtering, use all pixels
+            weights = np.bincount(inverse, minlength=len(unique_colors)).astype(np.float64)
         
-        xyz = np.dot(xyz_matrix, rgb)
+        fit_rows = np.flatnonzero(weights > 0)
+        if len(fit_rows) < num_colors:
+            # Fewer distinct colors than clusters; weighting cannot help here
+            return self._cluster_pixels(pixels, mask, num_colors, quantizer, space, profile)
         
-        # Normalize by D65 illuminant
-        xyz = xyz / np.array([0.95047, 1.00000, 1.08883])
+        points = self._to_cluster_space(unique_colors, space)
+        with extraction_profile.stage(profile, 'fit', engine=quantizer.name, points=len(fit_rows),
+                                      num_colors=num_colors) as entry:
+            centers, _ = quantizer.fit(points[fit_rows], num_colors, sample_weight=weights[fit_rows])
+            entry.update(iterations=quantizer.n_iter, inertia=quantizer.inertia)
         
-        # Convert to LAB
-        xyz = np.where(xyz > 0.008856, xyz ** (1/3), (7.787 * xyz + 16/116))
+        colors = self._centers_to_rgb(centers, space)
         
-        lab = np.array([
-            116 * xyz[1] - 16,
-            500 * (xyz[0] - xyz[1]),
-            200 * (xyz[1] - xyz[2])
-        ])
+        # Label every distinct color once, then gather labels for all pixels
+        with extraction_profile.stage(profile, 'predict', pixels=len(pixels), colors=len(points)):
+            unique_labels = quantizer.predict(points, centers)
+            all_labels = unique_labels[inverse]
         
-        return lab
+        counts = np.bincount(unique_labels, weights=weights, minlength=len(colors))
+        
+        return colors, counts, all_labels
     
-    def calculate_color_difference(self, color1_rgb, color2_rgb):
+    def _superpixel_palette(self, img_array, mask, num_colors, options, profile=None):
         """
-        Calculate Delta E (CIE76) color difference between two RGB colors
+        Cluster the mean colors of the image's superpixels, weighted by their (filtered) area
+        
+        Location analysis uses the superpixel centroids, so clustering, labeling and location
+        profiles all work on superpixels rather than pixels.
         """
+        height, width = img_array.shape[:2]
+        pixels = img_array.reshape(-1, 3)
+        with extraction_profile.stage(profile, 'superpixels', pixels=len(pixels)) as entry:
+            segments, num_segments = superpixels.slic(
+                color_space.rgb_to_lab(img_array), options['superpixel_size'],
+                self.SUPERPIXEL_COMPACTNESS, self.SUPERPIXEL_ITERATIONS
+            )
+            segments = segments.ravel()
+            entry['superpixels'] = num_segments
+        
+        areas = np.bincount(segments, minlength=num_segments)
+        mean_colors = np.stack([
+            np.bincount(segments, weights=pixels[:, c], minlength=num_segments) for c in range(3)
+        ], axis=1) / areas[:, None]
+        ys, xs = np.divmod(np.arange(len(pixels)), width)
+        centroid_rows = np.bincount(segments, weights=ys, minlength=num_segments) / areas
+        centroid_cols = np.bincount(segments, weights=xs, minlength=num_segments) / areas
+        
+        # Filtered pixel count of every superpixel
+        weights = np.bincount(segments, weights=mask, minlength=num_segments)
+        if weights.sum() < num_colors:
+            # If too few pixels after filtering, use all pixels
+            weights = areas.astype(np.float64)
+        fit_rows = np.flatnonzero(weights > 0)
+        
+        quantizer = quantizers.get_quantizer(options['engine'])
+        space = options.get('cluster_space', 'rgb')
+        points = self._to_cluster_space(mean_colors, space)
+        with extraction_profile.stage(profile, 'fit', engine=quantizer.name, points=len(fit_rows),
+                                      num_colors=num_colors) as entry:
+            centers, _ = quantizer.fit(points[fit_rows], min(num_colors, len(fit_rows)),
+                                       sample_weight=weights[fit_rows])
+            entry.update(iterations=quantizer.n_iter, inertia=quantizer.inertia)
+        
+        colors = self._centers_to_rgb(centers, space)
+        
+        with extraction_profile.stage(profile, 'predict', superpixels=num_segments):
+            segment_labels = quantizer.predict(points, centers)
+        counts = np.bincount(segment_labels, weights=weights, minlength=len(colors))
+        
+        with extraction_profile.stage(profile, 'locations', superpixels=num_segments, clusters=len(colors)):
+            row_counts, col_counts = self._centroid_profiles(
+                segment_labels, areas, centroid_rows, centroid_cols, len(colors), height, width
+            )
+            locations = self._locations_from_profiles(row_counts, col_counts, len(colors))
+        
+        label_image = segment_labels[segments].reshape(height, width)
+        return self._build_palette(colors, counts, locations, label_image)
+    
+    def _dominance_order(self, counts):
+        """Cluster indices sorted by pixel share, most dominant first (ties keep cluster order)"""
+        return np.argsort(-((np.asarray(counts) / np.sum(counts)) * 100), kind='stable')
+    
+    def _build_color_info(self, colors, counts, locations, order, errors=None):
+        """
+        Build the color_info list in the given cluster order from cluster colors, counts and
+        location info (plus the sampling error of every percentage, if estimated from a sample)
+        """
+        total_pixels = np.sum(counts)
+        
+        color_info = []
+        for i in order:
+            color = colors[i]
+            # Share of the filtered pixels in this cluster
+            percentage = (counts[i] / total_pixels) * 100
+            
+            # Convert to hex
+            hex_color = "#{:02x}{:02x}{:02x}".format(color[0], color[1], color[2])
+            
+            # Calculate additional color properties
+            hsv = colorsys.rgb_to_hsv(color[0]/255, color[1]/255, color[2]/255)
+            
+            color_info.append({
+                'rgb': tuple(color),
+                'hex': hex_color,
+                'percentage': percentage,
+                'hsv': hsv,
+                'brightness': np.mean(color),
+                'location_info': locations[i]
+            })
+            if errors is not None:
+                color_info[-1]['percentage_error'] = float(errors[i])
+        
+        return color_info
+    
+    def rgb_to_lab(self, rgb):
+        """
+        Convert RGB to LAB color space for better color distance calculations
+        
+        Accepts a single (R, G, B) color or an (N, 3) array of colors.
+        """
+        return color_space.rgb_to_lab(rgb)
+    
+    def calculate_color_difference(self, color1_rgb, color2_rgb, metric='cie76'):
+        """
+        Calculate Delta E color difference between two RGB colors
+        
+        Args:
+            color1_rgb: Reference RGB color
+            color2_rgb: RGB color to compare
+            metric: 'cie76' (default), 'cie94' or 'ciede2000'
+        """
+        if metric not in color_difference.METRICS:
+            raise ValueError(f"Unknown color difference metric '{metric}', expected one of {color_difference.METRICS}")
+        
         try:
             lab1 = self.rgb_to_lab(color1_rgb)
             lab2 = self.rgb_to_lab(color2_rgb)
             
-            # Calculate Delta E (CIE76)
-            delta_e = np.sqrt(np.sum((lab1 - lab2) ** 2))
-            
-            return delta_e
+            return color_difference.delta_e(lab1, lab2, metric)
         except Exception:
             # Fallback to simple Euclidean distance in RGB space
             return np.sqrt(np.sum((np.array(color1_rgb) - np.array(color2_rgb)) ** 2))
     
-    def _analyze_color_location(self, img_array, labels, cluster_id, color):
+    def _analyze_color_locations(self, img_array, labels, num_clusters):
         """
-        Analyze where a specific color cluster appears in the image
+        Analyze where every color cluster appears in the image
+        
+        All clusters are handled in one pass: two bincounts give the number of pixels of
+        each cluster in every row and every column, and the spreads, standard deviations
+        and regional coverage are derived from these profiles.
         
         Args:
             img_array: Image as numpy array
-            labels: K-means cluster labels for each pixel
-            cluster_id: ID of the cluster to analyze
-            color: RGB color of the cluster
+            labels: Cluster label of each pixel
+            num_clusters: Number of clusters
             
         Returns:
-            Dictionary with location information
+            List with a location information dictionary per cluster
         """
         try:
             height, width = img_array.shape[:2]
             
             # Reshape labels to match image dimensions
-            label_image = labels.reshape(height, width)
-            
-            # Find all pixels belonging to this color cluster
-            cluster_mask = (label_image == cluster_id)
-            
-            if not np.any(cluster_mask):
-                return {
-                    'regions': ['Not found'],
-                    'distribution': 'scattered',
-                    'primary_areas': [],
-                    'coverage': {'top': 0, 'middle': 0, 'bottom': 0, 'left': 0, 'center': 0, 'right': 0}
-                }
-            
-            # Get coordinates of pixels with this color
-            y_coords, x_coords = np.where(cluster_mask)
-            
-            # Analyze distribution
-            distribution = self._classify_distribution(y_coords, x_coords, height, width)
+            label_image = np.asarray(labels).reshape(height, width)
             
-            # Analyze coverage by regions
-            coverage = self._analyze_regional_coverage(y_coords, x_coords, height, width)
-            
-            # Find primary areas where this color appears
-            primary_areas = self._find_primary_areas(coverage)
-            
-            # Create descriptive regions
-            regions = self._describe_regions(coverage, primary_areas)
+            row_counts, col_counts = self._location_profiles(label_image, num_clusters)
+        except Exception:
+            row_counts, col_counts = None, None
+        
+        return self._locations_from_profiles(row_counts, col_counts, num_clusters)
+    
+    def _location_profiles(self, label_image, num_clusters):
+        """Pixel count of every cluster per row, (num_clusters, height), and per column, (num_clusters, width)"""
+        height, width = label_image.shape
+        label_image = label_image.astype(np.intp)
+        
+        rows = np.arange(height)[:, None]
+        cols = np.arange(width)[None, :]
+        row_counts = np.bincount(
+            (label_image * height + rows).ravel(), minlength=num_clusters * height
+        ).reshape(num_clusters, height)
+        col_counts = np.bincount(
+            (label_image * width + cols).ravel(), minlength=num_clusters * width
+        ).reshape(num_clusters, width)
+        
+        return row_counts, col_counts
+    
+    def _centroid_profiles(self, labels, areas, rows, cols, num_clusters, height, width):
+        """
+        Row and column profiles like _location_profiles, from regions instead of pixels:
+        each region's area is counted at its centroid row and column
+        """
+        rows = np.clip(np.rint(rows).astype(np.intp), 0, height - 1)
+        cols = np.clip(np.rint(cols).astype(np.intp), 0, width - 1)
+        row_counts = np.bincount(
+            labels * height + rows, weights=areas, minlength=num_clusters * height
+        ).reshape(num_clusters, height).astype(np.int64)
+        col_counts = np.bincount(
+            labels * width + cols, weights=areas, minlength=num_clusters * width
+        ).reshape(num_clusters, width).astype(np.int64)
+        
+        return row_counts, col_counts
+    
+    def _locations_from_profiles(self, row_counts, col_counts, num_clusters=None):
+        """Location information dictionary of every cluster from its row and column pixel counts"""
+        try:
+            locations = []
+            for cluster_id in range(len(row_counts)):
+                if not row_counts[cluster_id].any():
+                    locations.append({
+                        'regions': ['Not found'],
+                        'distribution': 'scattered',
+                        'primary_areas': [],
+                        'coverage': {'top': 0, 'middle': 0, 'bottom': 0, 'left': 0, 'center': 0, 'right': 0}
+                    })
+                    continue
+                
+                # Analyze distribution
+                distribution = self._classify_distribution(row_counts[cluster_id], col_counts[cluster_id])
+                
+                # Analyze coverage by regions
+                coverage = self._analyze_regional_coverage(row_counts[cluster_id], col_counts[cluster_id])
+                
+                # Find primary areas where this color appears
+                primary_areas = self._find_primary_areas(coverage)
+                
+                # Create descriptive regions
+                regions = self._describe_regions(coverage, primary_areas)
+                
+                locations.append({
+                    'regions': regions,
+                    'distribution': distribution,
+                    'primary_areas': primary_areas,
+                    'coverage': coverage
+                })
             
-            return {
-                'regions': regions,
-                'distribution': distribution,
-                'primary_areas': primary_areas,
-                'coverage': coverage
-            }
+            return locations
             
         except Exception as e:
-            return {
+            return [{
                 'regions': ['Analysis unavailable'],
                 'distribution': 'unknown',
                 'primary_areas': [],
                 'coverage': {'top': 0, 'middle': 0, 'bottom': 0, 'left': 0, 'center': 0, 'right': 0}
-            }
+            } for _ in range(num_clusters if num_clusters is not None else len(row_counts))]
+    
+    def _profile_stats(self, profile):
+        """Spread (max - min position) and standard deviation of positions from a per-position pixel count"""
+        occupied = np.flatnonzero(profile)
+        positions = np.arange(len(profile))
+        total = profile.sum()
+        mean = (profile * positions).sum() / total
+        std = np.sqrt((profile * (positions - mean) ** 2).sum() / total)
+        return occupied[-1] - occupied[0], std
     
-    def _classify_distribution(self, y_coords, x_coords, height, width):
-        """Classify how the color is distributed across the image"""
-        if len(y_coords) == 0:
+    def _classify_distribution(self, row_profile, col_profile):
+        """Classify how the color is distributed across the image from its row and column pixel counts"""
+        if not row_profile.any():
             return 'none'
         
+        height, width = len(row_profile), len(col_profile)
+        y_range, y_dev = self._profile_stats(row_profile)
+        x_range, x_dev = self._profile_stats(col_profile)
+        
         # Calculate spread
-        y_spread = (np.max(y_coords) - np.min(y_coords)) / height
-        x_spread = (np.max(x_coords) - np.min(x_coords)) / width
+        y_spread = y_range / height
+        x_spread = x_range / width
         
         # Calculate concentration
-        y_std = np.std(y_coords) / height
-        x_std = np.std(x_coords) / width
+        y_std = y_dev / height
+        x_std = x_dev / width
         
         if y_spread > 0.7 and x_spread > 0.7:
             return 'widespread'
@@ -236,35 +1080,38 @@ class ColorAnalyzer:
         else:
             return 'scattered'
     
-    def _analyze_regional_coverage(self, y_coords, x_coords, height, width):
-        """Analyze coverage in different regions of the image"""
+    def _analyze_regional_coverage(self, row_profile, col_profile):
+        """Analyze coverage in different regions of the image from its row and column pixel counts"""
         coverage = {
             'top': 0, 'middle': 0, 'bottom': 0,
             'left': 0, 'center': 0, 'right': 0
         }
         
-        if len(y_coords) == 0:
+        total_pixels = row_profile.sum()
+        if total_pixels == 0:
             return coverage
         
-        total_pixels = len(y_coords)
+        height, width = len(row_profile), len(col_profile)
         
         # Vertical regions
-        top_mask = y_coords < height / 3
-        middle_mask = (y_coords >= height / 3) & (y_coords < 2 * height / 3)
-        bottom_mask = y_coords >= 2 * height / 3
+        y_coords = np.arange(height)
+        top_rows = y_coords < height / 3
+        middle_rows = (y_coords >= height / 3) & (y_coords < 2 * height / 3)
+        bottom_rows = y_coords >= 2 * height / 3
         
-        coverage['top'] = np.sum(top_mask) / total_pixels * 100
-        coverage['middle'] = np.sum(middle_mask) / total_pixels * 100
-        coverage['bottom'] = np.sum(bottom_mask) / total_pixels * 100
+        coverage['top'] = row_profile[top_rows].sum() / total_pixels * 100
+        coverage['middle'] = row_profile[middle_rows].sum() / total_pixels * 100
+        coverage['bottom'] = row_profile[bottom_rows].sum() / total_pixels * 100
         
         # Horizontal regions
-        left_mask = x_coords < width / 3
-        center_mask = (x_coords >= width / 3) & (x_coords < 2 * width / 3)
-        right_mask = x_coords >= 2 * width / 3
+        x_coords = np.arange(width)
+        left_cols = x_coords < width / 3
+        center_cols = (x_coords >= width / 3) & (x_coords < 2 * width / 3)
+        right_cols = x_coords >= 2 * width / 3
         
-        coverage['left'] = np.sum(left_mask) / total_pixels * 100
-        coverage['center'] = np.sum(center_mask) / total_pixels * 100
-        coverage['right'] = np.sum(right_mask) / total_pixels * 100
+        coverage['left'] = col_profile[left_cols].sum() / total_pixels * 100
+        coverage['center'] = col_profile[center_cols].sum() / total_pixels * 100
+        coverage['right'] = col_profile[right_cols].sum() / total_pixels * 100
         
         return coverage
     
@@ -0,0 +1,116 @@
+import numpy as np
+
+# Metric names accepted by ColorMatcher and MatchingEngine
+METRICS = ('cie76', 'cie94', 'ciede2000')
+
+_POW25_7 = 25.0 ** 7
+
+def chroma(lab):
+    """C*ab for an (..., 3) Lab array; precompute it once for a catalog and pass it back in"""
+    lab = np.asarray(lab)
+    return np.hypot(lab[..., 1], lab[..., 2])
+
+def delta_e_cie76(lab1, lab2, chroma1=None, chroma2=None):
+    """Euclidean distance between broadcastable (..., 3) Lab arrays"""
+    diff = np.asarray(lab1) - np.asarray(lab2)
+    return np.sqrt(np.sum(diff * diff, axis=-1))
+
+def delta_e_cie94(lab1, lab2, chroma1=None, chroma2=None):
+    """
+    CIE94 color difference (graphic arts weights) between broadcastable (..., 3) Lab arrays
+
+    lab1 is the reference color, so its chroma sets the weighting functions.
+    """
+    lab1, lab2 = np.asarray(lab1), np.asarray(lab2)
+    c1 = chroma(lab1) if chroma1 is None else chroma1
+    c2 = chroma(lab2) if chroma2 is None else chroma2
+
+    d_l = lab1[..., 0] - lab2[..., 0]
+    d_a = lab1[..., 1] - lab2[..., 1]
+    d_b = lab1[..., 2] - lab2[..., 2]
+    d_c = c1 - c2
+    d_h2 = np.maximum(d_a * d_a + d_b * d_b - d_c * d_c, 0)
+
+    s_c = 1 + 0.045 * c1
+    s_h = 1 + 0.015 * c1
+
+    return np.sqrt(d_l * d_l + (d_c / s_c) ** 2 + d_h2 / (s_h * s_h))
+
+def delta_e_ciede2000(lab1, lab2, chroma1=None, chroma2=None):
+    """CIEDE2000 color difference between broadcastable (..., 3) Lab arrays"""
+    lab1, lab2 = np.asarray(lab1), np.asarray(lab2)
+    l1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    l2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+    c1 = chroma(lab1) if chroma1 is None else chroma1
+    c2 = chroma(lab2) if chroma2 is None else chroma2
+
+    # a' rescaling by the G factor
+    c_bar7 = ((c1 + c2) / 2) ** 7
+    g = 0.5 * (1 - np.sqrt(c_bar7 / (c_bar7 + _POW25_7)))
+    a1p = (1 + g) * a1
+    a2p = (1 + g) * a2
+    c1p = np.hypot(a1p, b1)
+    c2p = np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+    chroma_product = c1p * c2p
+    d_lp = l2 - l1
+    d_cp = c2p - c1p
+    d_hp = h2p - h1p
+    d_hp = np.where(d_hp > 180, d_hp - 360, np.where(d_hp < -180, d_hp + 360, d_hp))
+    d_hp = np.where(chroma_product == 0, 0, d_hp)
+    d_big_hp = 2 * np.sqrt(chroma_product) * np.sin(np.radians(d_hp / 2))
+
+    l_barp = (l1 + l2) / 2
+    c_barp = (c1p + c2p) / 2
+    h_sum = h1p + h2p
+    h_barp = np.where(
+        np.abs(h1p - h2p) <= 180, h_sum / 2,
+        np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2)
+    )
+    h_barp = np.where(chroma_product == 0, h_sum, h_barp)
+
+    t = (1
+         - 0.17 * np.cos(np.radians(h_barp - 30))
+         + 0.24 * np.cos(np.radians(2 * h_barp))
+         + 0.32 * np.cos(np.radians(3 * h_barp + 6))
+         - 0.20 * np.cos(np.radians(4 * h_barp - 63)))
+    d_theta = 30 * np.exp(-((h_barp - 275) / 25) ** 2)
+    c_barp7 = c_barp ** 7
+    r_c = 2 * np.sqrt(c_barp7 / (c_barp7 + _POW25_7))
+    l_offset2 = (l_barp - 50) ** 2
+    s_l = 1 + 0.015 * l_offset2 / np.sqrt(20 + l_offset2)
+    s_c = 1 + 0.045 * c_barp
+    s_h = 1 + 0.015 * c_barp * t
+    r_t = -np.sin(np.radians(2 * d_theta)) * r_c
+
+    l_term = d_lp / s_l
+    c_term = d_cp / s_c
+    h_term = d_big_hp / s_h
+    return np.sqrt(np.maximum(l_term ** 2 + c_term ** 2 + h_term ** 2 + r_t * c_term * h_term, 0))
+
+_DELTA_E_FUNCTIONS = {
+    'cie76': delta_e_cie76,
+    'cie94': delta_e_cie94,
+    'ciede2000': delta_e_ciede2000
+}
+
+def delta_e(lab1, lab2, metric='cie76', chroma1=None, chroma2=None):
+    """
+    Color difference between broadcastable (..., 3) Lab arrays
+
+    Args:
+        lab1: Reference (target) Lab colors
+        lab2: Sample (catalog) Lab colors
+        metric: One of METRICS
+        chroma1, chroma2: Optional precomputed C*ab of lab1 / lab2
+
+    Returns:
+        Array of color differences with the broadcast shape of the inputs
+    """
+    try:
+        function = _DELTA_E_FUNCTIONS[metric]
+    except KeyError:
+        raise ValueError(f"Unknown color difference metric '{metric}', expected one of {METRICS}")
+    return function(lab1, lab2, chroma1, chroma2)
@@ -0,0 +1,75 @@
+import numpy as np
+import color_space
+
+class ColorHierarchy:
+    """
+    Over-segmented color codebook of an image plus a weighted Ward merge tree over it in Lab
+
+    Built once per image; cut() then answers any number of colors without touching the pixels.
+    """
+
+    def __init__(self, code_labels, code_counts, code_colors, row_counts, col_counts):
+        """
+        Args:
+            code_labels: (height, width) codebook index of every pixel
+            code_counts: Filtered pixel count of every code (its weight)
+            code_colors: (n, 3) mean RGB color of every code
+            row_counts: (n, height) pixel count of every code per row
+            col_counts: (n, width) pixel count of every code per column
+        """
+        self.code_labels = code_labels
+        self.code_counts = np.asarray(code_counts, dtype=np.float64)
+        self.code_colors = np.asarray(code_colors, dtype=np.float64)
+        self.row_counts = row_counts
+        self.col_counts = col_counts
+        self.merges = self._ward_merges(color_space.rgb_to_lab(self.code_colors).astype(np.float64), self.code_counts)
+
+    def __len__(self):
+        return len(self.code_colors)
+
+    @staticmethod
+    def _ward_merges(lab, weights):
+        """
+        Agglomerate the codes bottom-up, always merging the pair that adds the least weighted
+        squared Lab error (Ward's criterion)
+
+        Returns:
+            List of (kept, absorbed) code index pairs in merge order
+        """
+        centers = lab.copy()
+        weights = weights.copy()
+        active = np.ones(len(centers), dtype=bool)
+        merges = []
+
+        for _ in range(len(centers) - 1):
+            rows = np.flatnonzero(active)
+            diff = centers[rows][:, None, :] - centers[rows][None, :, :]
+            w = weights[rows]
+            pair_weights = w[:, None] * w[None, :] / np.maximum(w[:, None] + w[None, :], 1e-12)
+            cost = pair_weights * np.sum(diff * diff, axis=-1)
+            cost[np.tril_indices(len(rows))] = np.inf
+
+            i, j = np.unravel_index(np.argmin(cost), cost.shape)
+            kept, absorbed = rows[i], rows[j]
+            total = weights[kept] + weights[absorbed]
+            if total > 0:
+                centers[kept] = (weights[kept] * centers[kept] + weights[absorbed] * centers[absorbed]) / total
+            else:
+                centers[kept] = (centers[kept] + centers[absorbed]) / 2
+            weights[kept] = total
+            active[absorbed] = False
+            merges.append((int(kept), int(absorbed)))
+
+        return merges
+
+    def cut(self, num_colors):
+        """
+        Cut the merge tree into (at most) num_colors clusters
+
+        Returns:
+            (n,) cluster index of every code, numbered in order of each cluster's first code
+        """
+        parent = np.arange(len(self))
+        for kept, absorbed in self.merges[:max(len(self) - num_colors, 0)]:
+            parent[parent == absorbed] = kept
+        return np.unique(parent, return_inverse=True)[1].reshape(-1)
@@ -1,14 +1,35 @@
 import numpy as np
-from color_analyzer import ColorAnalyzer
+from matching_engine import MatchingEngine
+from match_lut import MatchLookupTable
+from color_difference import METRICS
 
 class ColorMatcher:
     """Matches extracted colors to colored pencil collections"""
     
-    def __init__(self, pencil_database):
+    # Brands returned by find_matches and match_palette unless others are requested
+    DEFAULT_MATCH_BRANDS = ['Prismacolor', 'Faber Castell']
+    
+    def __init__(self, pencil_database, lookup_table=None, metric='cie76', lut_path=None):
         self.pencil_db = pencil_database
-        self.color_analyzer = ColorAnalyzer()
+        self.metric = self._check_metric(metric)
+        self.engine = MatchingEngine(pencil_database)
+        
+        # Optional precomputed lookup table (see match_lut.py), given directly or as a saved file
+        if lookup_table is None and lut_path:
+            try:
+                lookup_table = MatchLookupTable.load(lut_path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load match lookup table {lut_path}: {str(e)}")
+        if lookup_table is not None:
+            self.engine.attach_lookup_table(lookup_table)
+    
+    def _check_metric(self, metric):
+        """Validate a color difference metric name ('cie76', 'cie94' or 'ciede2000')"""
+        if metric not in METRICS:
+            raise ValueError(f"Unknown color difference metric '{metric}', expected one of {METRICS}")
+        return metric
     
-    def find_matches(self, target_rgb, max_matches=5, max_difference=50):
+    def find_matches(self, target_rgb, max_matches=5, max_difference=50, metric=None):
         """
         Find the closest matching pencils for a given RGB color
         
@@ -16,85 +37,100 @@ class ColorMatcher:
             target_rgb: Tuple of (R, G, B) values
             max_matches: Maximum number of matches to return per brand
             max_difference: Maximum color difference to consider a match
+            metric: Color difference metric (defaults to the matcher's metric)
         
         Returns:
             List of dictionaries containing match information
         """
-        all_pencils = self.pencil_db.get_all_pencils()
-        matches = []
-        
-        for _, pencil in all_pencils.iterrows():
-            pencil_rgb = pencil['rgb']
-            
-            # Calculate color difference
-            color_diff = self.color_analyzer.calculate_color_difference(
-                target_rgb, pencil_rgb
-            )
-            
-            # Only consider matches within the difference threshold
-            if color_diff <= max_difference:
-                match_info = {
-                    'brand': pencil['brand'],
-                    'name': pencil['name'],
-                    'code': pencil['code'],
-                    'pencil_rgb': pencil_rgb,
-                    'target_rgb': target_rgb,
-                    'color_difference': color_diff
-                }
-                matches.append(match_info)
-        
-        # Sort by color difference (closest first)
-        matches.sort(key=lambda x: x['color_difference'])
-        
-        # Limit matches per brand
-        prismacolor_matches = [m for m in matches if m['brand'] == 'Prismacolor'][:max_matches]
-        faber_castell_matches = [m for m in matches if m['brand'] == 'Faber Castell'][:max_matches]
-        
-        return prismacolor_matches + faber_castell_matches
+        result = self.match_palette(
+            [target_rgb], top_k=max_matches, max_difference=max_difference, metric=metric
+        )
+        return result['palette_matches'][0]
     
-    def find_best_match(self, target_rgb, brand=None):
+    def match_palette(self, palette_rgb, top_k=3, max_difference=50, brands=None, return_matrix=False,
+                      metric=None):
+        """
+        Match a whole palette against the catalog in one vectorized pass
+        
+        Args:
+            palette_rgb: (k, 3) array or list of RGB tuples
+            top_k: Maximum number of matches to return per brand and color,
+                or None for every pencil within max_difference
+            max_difference: Maximum color difference to consider a match
+            brands: Brands to match against (defaults to DEFAULT_MATCH_BRANDS)
+            return_matrix: Also return the full k x N color difference matrix
+            metric: 'cie76', 'cie94' or 'ciede2000' (defaults to the matcher's metric)
+        
+        Returns:
+            Dictionary with:
+                'matches': flat list of match dictionaries for all colors, in palette order
+                'palette_matches': color index -> list of match dictionaries
+                'indices': brand -> (k, top_k) catalog row indices, padded with -1
+                'distances': brand -> (k, top_k) color differences, padded with NaN
+                'distance_matrix': (k, N) color differences (only if return_matrix)
+        """
+        brands = self.DEFAULT_MATCH_BRANDS if brands is None else list(brands)
+        metric = self.metric if metric is None else self._check_metric(metric)
+        targets = [tuple(color) for color in palette_rgb]
+        
+        result = {'matches': [], 'palette_matches': {}, 'indices': {}, 'distances': {}}
+        if not targets:
+            return result
+        
+        brand_results = self.engine.nearest_per_brand(
+            targets, top_k, brands=brands, max_difference=max_difference, metric=metric
+        )
+        
+        for brand, per_color in brand_results.items():
+            width = top_k if top_k is not None else max([len(rows) for rows, _ in per_color] + [0])
+            indices = np.full((len(targets), width), -1, dtype=np.intp)
+            brand_distances = np.full((len(targets), width), np.nan, dtype=np.float32)
+            for i, (rows, color_distances) in enumerate(per_color):
+                indices[i, :len(rows)] = rows
+                brand_distances[i, :len(rows)] = color_distances
+            result['indices'][brand] = indices
+            result['distances'][brand] = brand_distances
+        
+        for i, target_rgb in enumerate(targets):
+            color_matches = []
+            for brand in brands:
+                rows, color_distances = brand_results[brand][i]
+                for row, color_diff in zip(rows, color_distances):
+                    color_matches.append(self.engine.match_record(row, target_rgb, color_diff))
+            result['palette_matches'][i] = color_matches
+            result['matches'].extend(color_matches)
+        
+        if return_matrix:
+            result['distance_matrix'] = self.engine.distance_matrix(targets, metric=metric)
+        
+        return result
+    
+    def find_best_match(self, target_rgb, brand=None, metric=None):
         """
         Find the single best matching pencil for a color
         
         Args:
             target_rgb: Tuple of (R, G, B) values
             brand: Optional brand filter ('Prismacolor' or 'Faber Castell')
+            metric: Color difference metric (defaults to the matcher's metric)
         
         Returns:
             Dictionary containing the best match information
         """
-        if brand:
-            if brand == 'Prismacolor':
-                pencils = self.pencil_db.get_prismacolor_pencils()
-            elif brand == 'Faber Castell':
-                pencils = self.pencil_db.get_faber_castell_pencils()
-            else:
-                pencils = self.pencil_db.get_all_pencils()
-        else:
-            pencils = self.pencil_db.get_all_pencils()
-        
-        best_match = None
-        min_difference = float('inf')
-        
-        for _, pencil in pencils.iterrows():
-            pencil_rgb = pencil['rgb']
-            color_diff = self.color_analyzer.calculate_color_difference(
-                target_rgb, pencil_rgb
-            )
-            
-            if color_diff < min_difference:
-                min_difference = color_diff
-                brand_name = pencil.get('brand', brand if brand else 'Unknown')
-                best_match = {
-                    'brand': brand_name,
-                    'name': pencil['name'],
-                    'code': pencil['code'],
-                    'pencil_rgb': pencil_rgb,
-                    'target_rgb': target_rgb,
-                    'color_difference': color_diff
-                }
-        
-        return best_match
+        metric = self.metric if metric is None else self._check_metric(metric)
+        
+        rows = None
+        if brand in ('Prismacolor', 'Faber Castell'):
+            rows = self.engine.brand_rows[brand]
+        
+        distances = self.engine.distance_matrix(target_rgb, metric=metric)
+        best_rows = self.engine.top_k(distances, 1, rows)[0]
+        
+        if len(best_rows) == 0:
+            return None
+        
+        best_row = best_rows[0]
+        return self.engine.match_record(best_row, target_rgb, distances[0, best_row])
     
     def get_color_palette_matches(self, color_palette, max_matches_per_color=3):
         """
@@ -107,16 +143,9 @@ class ColorMatcher:
         Returns:
             Dictionary with color index as key and matches as values
         """
-        palette_matches = {}
-        
-        for i, color_rgb in enumerate(color_palette):
-            matches = self.find_matches(
-                color_rgb, 
-                max_matches=max_matches_per_color
-            )
-            palette_matches[i] = matches
+        result = self.match_palette(color_palette, top_k=max_matches_per_color)
         
-        return palette_matches
+        return result['palette_matches']
     
     def calculate_match_quality(self, color_difference):
         """
@@ -0,0 +1,84 @@
+import numpy as np
+
+# sRGB (D65) -> XYZ matrix
+RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041]
+], dtype=np.float32)
+
+# XYZ -> linear sRGB matrix
+XYZ_TO_RGB = np.linalg.inv(RGB_TO_XYZ).astype(np.float32)
+
+# D65 reference white
+D65_WHITE = np.array([0.95047, 1.00000, 1.08883], dtype=np.float32)
+
+def srgb_to_linear(values):
+    """Apply the inverse sRGB gamma curve to values in the 0-1 range"""
+    values = np.asarray(values, dtype=np.float32)
+    return np.where(values > 0.04045, ((values + 0.055) / 1.055) ** 2.4, values / 12.92).astype(np.float32)
+
+# Linear light value for every 8-bit sRGB channel value
+SRGB_TO_LINEAR_LUT = srgb_to_linear(np.arange(256, dtype=np.float32) / 255.0)
+
+# XYZ -> Lab matrix for the cube-rooted XYZ values (rows give L + 16, a, b)
+_F_TO_LAB = np.array([
+    [0.0, 116.0, 0.0],
+    [500.0, -500.0, 0.0],
+    [0.0, 200.0, -200.0]
+], dtype=np.float32)
+
+def rgb_to_linear(rgb):
+    """
+    Convert sRGB colors to linear RGB in the 0-1 range
+
+    Integer input (uint8 pixel buffers, RGB tuples) goes through the 256-entry
+    lookup table; float input is taken to be on the 0-255 scale.
+    """
+    rgb = np.asarray(rgb)
+    if np.issubdtype(rgb.dtype, np.integer):
+        return SRGB_TO_LINEAR_LUT[np.clip(rgb, 0, 255)]
+    return srgb_to_linear(rgb / 255.0)
+
+def rgb_to_lab(rgb):
+    """
+    Convert sRGB colors to CIE Lab (D65)
+
+    Args:
+        rgb: A single (R, G, B) color or an (..., 3) array of colors on the 0-255 scale
+
+    Returns:
+        float32 array of the same shape holding L, a, b
+    """
+    linear = rgb_to_linear(rgb)
+    xyz = np.dot(linear, (RGB_TO_XYZ / D65_WHITE[:, None]).T)
+
+    xyz = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+
+    lab = np.dot(xyz, _F_TO_LAB.T)
+    lab[..., 0] -= 16
+    return lab.astype(np.float32, copy=False)
+
+def linear_to_srgb(values):
+    """Apply the sRGB gamma curve to linear values in the 0-1 range"""
+    values = np.clip(np.asarray(values, dtype=np.float32), 0, 1)
+    return np.where(values > 0.0031308, 1.055 * values ** (1 / 2.4) - 0.055, values * 12.92).astype(np.float32)
+
+def lab_to_rgb(lab):
+    """
+    Convert CIE Lab (D65) colors back to sRGB (the inverse of rgb_to_lab)
+
+    Args:
+        lab: A single (L, a, b) color or an (..., 3) array of colors
+
+    Returns:
+        float32 array of the same shape on the 0-255 scale, clipped to the sRGB gamut
+    """
+    lab = np.asarray(lab, dtype=np.float32)
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200], axis=-1)
+
+    xyz = np.where(f > 0.206893, f ** 3, (f - 16 / 116) / 7.787) * D65_WHITE
+    linear = np.dot(xyz, XYZ_TO_RGB.T)
+
+    return linear_to_srgb(linear) * 255
@@ -0,0 +1,85 @@
+import os
+import threading
+from contextlib import contextmanager
+from threadpoolctl import ThreadpoolController
+
+class ComputeBudget:
+    """
+    Limits the CPU used by color analyses running in one process
+
+    At most `max_concurrent` heavy analyses run at a time; further ones wait in line on
+    a semaphore instead of competing for cores. Every analysis runs its OpenMP code
+    (scikit-learn's KMeans) with at most `threads_per_analysis` threads, and while any
+    analysis runs the BLAS thread pools used by NumPy are capped to the same number.
+    Thread pools are looked up when the budget is created, so create it after
+    scikit-learn has been imported (as importing color_analyzer does).
+    """
+
+    def __init__(self, threads_per_analysis=None, max_concurrent=None):
+        """
+        Args:
+            threads_per_analysis: OpenMP / BLAS threads one analysis may use
+                (default: CPU count divided by max_concurrent)
+            max_concurrent: Heavy analyses allowed to run at once (default 2)
+        """
+        cpu_count = os.cpu_count() or 1
+        self.max_concurrent = max(1, max_concurrent or 2)
+        self.threads_per_analysis = max(1, threads_per_analysis or cpu_count // self.max_concurrent)
+
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrent)
+        self._controller = ThreadpoolController()
+        self._lock = threading.Lock()
+        self._limiter = None
+        self.active = 0
+        self.waiting = 0
+
+    @contextmanager
+    def limit(self):
+        """Run the enclosed analysis within the budget, waiting for a free slot first"""
+        with self._lock:
+            self.waiting += 1
+        try:
+            self.semaphore.acquire()
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        try:
+            with self._lock:
+                # BLAS limits are process-wide: set them when the first analysis starts
+                # and restore them when the last one finishes
+                if self.active == 0:
+                    self._limiter = self._controller.select(user_api='blas').limit(
+                        limits=self.threads_per_analysis
+                    )
+                self.active += 1
+            # OpenMP limits only apply to the calling thread, so every analysis sets (and
+            # restores) its own, in the thread it runs in
+            with self._controller.select(user_api='openmp').limit(limits=self.threads_per_analysis):
+                yield
+        finally:
+            with self._lock:
+                self.active -= 1
+                if self.active == 0 and self._limiter is not None:
+                    self._limiter.restore_original_limits()
+                    self._limiter = None
+            self.semaphore.release()
+
+_default_budget = None
+_default_budget_lock = threading.Lock()
+
+def get_default_budget():
+    """
+    Process-wide compute budget configured from the environment:
+    ANALYSIS_THREADS (threads per analysis) and ANALYSIS_MAX_CONCURRENT (analyses at once, default 2)
+    """
+    global _default_budget
+    with _default_budget_lock:
+        if _default_budget is None:
+            threads = os.getenv('ANALYSIS_THREADS')
+            max_concurrent = os.getenv('ANALYSIS_MAX_CONCURRENT')
+            _default_budget = ComputeBudget(
+                threads_per_analysis=int(threads) if threads else None,
+                max_concurrent=int(max_concurrent) if max_concurrent else None
+            )
+        return _default_budget
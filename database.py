@@ -1,5 +1,6 @@
 import os
 import json
+import threading
 from datetime import datetime, timedelta
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, JSON, Float, LargeBinary, func
 from sqlalchemy.ext.declarative import declarative_base
@@ -44,6 +45,18 @@ class ColorAnalysis(Base):
     analysis_time = Column(DateTime, default=datetime.utcnow)
     processing_time_seconds = Column(Float)
 
+class AnalysisProfile(Base):
+    """Table to store per-stage timings of color analyses"""
+    __tablename__ = 'analysis_profiles'
+    
+    id = Column(Integer, primary_key=True)
+    analysis_id = Column(Integer, nullable=False)
+    session_id = Column(String(255), nullable=False)
+    parameters = Column(JSON)  # Extraction parameters (mode, engine, num_colors, ...)
+    stages = Column(JSON)  # Time and sizes of every stage, in the order they ran
+    total_seconds = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class PencilMatch(Base):
     """Table to store pencil matching results"""
     __tablename__ = 'pencil_matches'
@@ -60,6 +73,22 @@ class PencilMatch(Base):
     match_quality = Column(String(50))
     created_at = Column(DateTime, default=datetime.utcnow)
 
+# One engine (and connection pool) per database URL for the whole process
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_engine(database_url):
+    """Get the shared SQLAlchemy engine for a database URL, creating its tables on first use"""
+    with _engines_lock:
+        if database_url not in _engines:
+            print(f"[DEBUG] Using database URL: {database_url}")
+            engine = create_engine(database_url)
+
+            # Auto-create tables
+            Base.metadata.create_all(bind=engine)
+            _engines[database_url] = engine
+        return _engines[database_url]
+
 class DatabaseManager:
     """Database manager for color analysis app"""
 
@@ -70,13 +99,8 @@ class DatabaseManager:
             self.database_url = 'sqlite:///mydata.db'
             print("⚠️  DATABASE_URL not found. Using default: sqlite:///mydata.db")
 
-        print(f"[DEBUG] Using database URL: {self.database_url}")
-
-        self.engine = create_engine(self.database_url)
+        self.engine = get_engine(self.database_url)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-
-        # Auto-create tables
-        Base.metadata.create_all(bind=self.engine)
     
     def get_session(self):
         """Get a database session"""
@@ -145,6 +169,50 @@ class DatabaseManager:
         finally:
             db.close()
     
+    def save_analysis_profile(self, analysis_id, session_id, profile):
+        """Save the stage timings of an analysis (an ExtractionProfile.to_dict() result)"""
+        db = self.get_session()
+        try:
+            profile = self._convert_numpy_types(profile)
+            
+            analysis_profile = AnalysisProfile(
+                analysis_id=analysis_id,
+                session_id=session_id,
+                parameters=profile['parameters'],
+                stages=profile['stages'],
+                total_seconds=profile['total_seconds']
+            )
+            db.add(analysis_profile)
+            db.commit()
+            return analysis_profile.id
+        finally:
+            db.close()
+    
+    def get_stage_timings(self, limit=100):
+        """Get the stage timings of the most recent analyses, one row per stage run"""
+        db = self.get_session()
+        try:
+            profiles = db.query(AnalysisProfile).order_by(
+                AnalysisProfile.created_at.desc()
+            ).limit(limit).all()
+            
+            rows = []
+            for profile in profiles:
+                for stage in profile.stages or []:
+                    rows.append({
+                        'analysis_id': profile.analysis_id,
+                        'created_at': profile.created_at,
+                        'mode': (profile.parameters or {}).get('mode'),
+                        'engine': (profile.parameters or {}).get('engine'),
+                        'stage': stage['stage'],
+                        'seconds': stage['seconds'],
+                        'total_seconds': profile.total_seconds
+                    })
+            
+            return pd.DataFrame(rows)
+        finally:
+            db.close()
+    
     def _convert_numpy_types(self, obj):
         """Convert numpy types to Python native types for JSON serialization"""
         import numpy as np
@@ -295,6 +363,7 @@ class DatabaseManager:
             if session_ids:
                 # Delete related data
                 db.query(PencilMatch).filter(PencilMatch.session_id.in_(session_ids)).delete()
+                db.query(AnalysisProfile).filter(AnalysisProfile.session_id.in_(session_ids)).delete()
                 db.query(ColorAnalysis).filter(ColorAnalysis.session_id.in_(session_ids)).delete()
                 db.query(ImageUpload).filter(ImageUpload.session_id.in_(session_ids)).delete()
                 db.query(UserSession).filter(UserSession.session_id.in_(session_ids)).delete()
@@ -0,0 +1,60 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+class ExtractionProfile:
+    """
+    Wall-clock time and sizes of every stage of one color extraction
+
+    Pass one to ColorAnalyzer.extract_palette / extract_dominant_colors (profile=...)
+    and it is filled in while the extraction runs. Stages are kept in the order they
+    ran; a stage that runs more than once (e.g. 'fit' in deadline-bounded extraction)
+    has one entry per run.
+    """
+
+    def __init__(self):
+        self.parameters = {}
+        self.stages = []
+        self.total_seconds = None
+
+    @contextmanager
+    def stage(self, name, **counters):
+        """
+        Time the enclosed block as a stage
+
+        Yields:
+            The stage's entry (a dict with 'stage', 'seconds' and the counters), so
+            counters only known at the end of the stage can be added to it
+        """
+        entry = {'stage': name, 'seconds': 0.0}
+        entry.update(counters)
+        self.stages.append(entry)
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = time.perf_counter() - start
+
+    def add(self, name, seconds, **counters):
+        """Record a stage that was timed elsewhere"""
+        entry = {'stage': name, 'seconds': seconds}
+        entry.update(counters)
+        self.stages.append(entry)
+        return entry
+
+    def seconds(self, name):
+        """Total time spent in a stage (0 if it did not run)"""
+        return sum(entry['seconds'] for entry in self.stages if entry['stage'] == name)
+
+    def to_dict(self):
+        """Plain (JSON-serializable) representation of the profile"""
+        return {
+            'parameters': dict(self.parameters),
+            'total_seconds': self.total_seconds,
+            'stages': [dict(entry) for entry in self.stages]
+        }
+
+def stage(profile, name, **counters):
+    """profile.stage(name, **counters), or a no-op block when profile is None"""
+    if profile is None:
+        return nullcontext({})
+    return profile.stage(name, **counters)
@@ -0,0 +1,177 @@
+import io
+import numpy as np
+from PIL import Image
+
+def open_image(source):
+    """
+    Open an image lazily: size, format and mode are read from the header, pixels are not decoded yet
+
+    Args:
+        source: Encoded image bytes, a file path or a binary file-like object
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+def reduce_image(image, max_size):
+    """
+    Shrink an image by the largest integer factor that keeps its longest side at least max_size
+
+    Image.reduce box-averages whole pixel blocks, which is much cheaper than a LANCZOS resize
+    of the full image; callers resize the (at most 2x larger) result to the exact size.
+    """
+    factor = max(image.size) // max_size
+    if factor < 2:
+        return image
+
+    if image.mode not in ('L', 'LA', 'RGB', 'RGBA', 'RGBa', 'La', 'I', 'F', 'CMYK', 'YCbCr'):
+        # Palette and bilevel images cannot be averaged directly
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    return image.reduce(factor)
+
+def load_image(source, max_size=None):
+    """
+    Decode an image straight to (close to) the size it will be used at
+
+    JPEGs are decoded at a reduced DCT scale (Image.draft, 1/2 to 1/8), so a large photo
+    is never decompressed at full resolution; other formats are decoded and then shrunk
+    with reduce_image. The result's longest side is at least max_size (unless the
+    original is smaller) and less than twice it.
+
+    Args:
+        source: Encoded image bytes, a file path, a binary file-like object or an
+            image returned by open_image that has not been loaded yet
+        max_size: Target size of the longest side, or None to decode at full resolution
+
+    Returns:
+        Decoded PIL Image (format and info of the original are kept)
+    """
+    image = source if isinstance(source, Image.Image) else open_image(source)
+    image_format = image.format
+
+    if max_size is not None and max(image.size) > max_size and image.format in ('JPEG', 'MPO'):
+        scale = max_size / max(image.size)
+        # draft picks the smallest DCT scale whose size is still >= the requested size
+        image.draft(image.mode if image.mode in ('RGB', 'L') else None,
+                    (max(1, int(image.size[0] * scale + 0.5)), max(1, int(image.size[1] * scale + 0.5))))
+
+    image.load()
+
+    if max_size is not None:
+        reduced = reduce_image(image, max_size)
+        if reduced is not image:
+            reduced.format = image_format
+            reduced.info = dict(image.info)
+            image = reduced
+
+    return image
+
+# Raw (uncompressed) pixel layouts iter_strips reads row by row from the file:
+# rawmode -> (bytes per pixel, positions of R, G, B in each pixel)
+_RAW_LAYOUTS = {
+    'RGB': (3, (0, 1, 2)),
+    'BGR': (3, (2, 1, 0)),
+    'RGBX': (4, (0, 1, 2)),
+    'RGBA': (4, (0, 1, 2)),
+    'BGRX': (4, (2, 1, 0)),
+    'BGRA': (4, (2, 1, 0)),
+    'L': (1, (0, 0, 0))
+}
+
+def _raw_layout(image):
+    """(offset, stride, orientation, bytes per pixel, channel positions) if the image is one raw tile we can read directly"""
+    if len(getattr(image, 'tile', ())) != 1 or image.mode not in ('RGB', 'RGBA', 'L'):
+        return None
+    tile = image.tile[0]
+    codec, extents, offset, args = tile[0], tile[1], tile[2], tile[3]
+    if codec != 'raw' or tuple(extents) != (0, 0) + image.size:
+        return None
+    if isinstance(args, str):
+        args = (args, 0, 1)
+    rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+    if rawmode not in _RAW_LAYOUTS or orientation not in (1, -1):
+        return None
+
+    pixel_bytes, channels = _RAW_LAYOUTS[rawmode]
+    return offset, stride or image.size[0] * pixel_bytes, orientation, pixel_bytes, channels
+
+def bound_decode_size(image, max_decode_pixels):
+    """
+    Make sure iter_strips decodes at most max_decode_pixels pixels of an image at once
+
+    Raw single-tile images are streamed from the file and always fit. Other formats
+    are decoded whole: a JPEG that is too large is switched to the smallest DCT
+    reduction (Image.draft, 1/2 to 1/8) that fits, anything else raises ValueError
+    instead of silently decoding the full image.
+
+    Args:
+        image: Image returned by open_image that has not been loaded yet
+        max_decode_pixels: Upper bound on the pixels decoded in one piece
+
+    Returns:
+        The same image; its size is reduced if a JPEG draft scale was selected
+    """
+    width, height = image.size
+    # Loaded images (no tiles left) are already decoded; raw ones are streamed from the file
+    if not getattr(image, 'tile', None) or _raw_layout(image) is not None or width * height <= max_decode_pixels:
+        return image
+
+    if image.format in ('JPEG', 'MPO'):
+        for scale in (2, 4, 8):
+            size = (-(-width // scale), -(-height // scale))
+            if size[0] * size[1] <= max_decode_pixels:
+                image.draft(image.mode if image.mode in ('RGB', 'L') else None, size)
+                return image
+
+    raise ValueError(
+        f"Cannot stream this {image.format} image: it is not stored as uncompressed raw pixels, "
+        f"and decoding its {width}x{height} pixels exceeds max_decode_pixels ({max_decode_pixels})"
+    )
+
+def iter_strips(source, max_strip_pixels=1 << 20, max_decode_pixels=None):
+    """
+    Yield an image as horizontal strips of RGB pixels, top to bottom
+
+    Uncompressed images stored as a single raw tile (plain TIFF, BMP, PPM) are read straight
+    from the file one strip at a time, so memory stays bounded by the strip size. Other
+    formats (PNG, JPEG, compressed TIFF, ...) cannot be decoded partially by Pillow; they
+    are decoded once and then sliced, without any further full-size copies. Pass
+    max_decode_pixels to bound that decode (see bound_decode_size).
+
+    Args:
+        source: Encoded image bytes, a file path, a binary file-like object or an
+            image returned by open_image that has not been loaded yet
+        max_strip_pixels: Upper bound on the pixels in one strip
+        max_decode_pixels: Upper bound on the pixels decoded whole for formats that cannot
+            be streamed (None = no bound)
+
+    Yields:
+        Tuples of (top row, (rows, width, 3) uint8 array)
+    """
+    image = source if isinstance(source, Image.Image) else open_image(source)
+    if max_decode_pixels is not None:
+        image = bound_decode_size(image, max_decode_pixels)
+    width, height = image.size
+    strip_height = max(1, max_strip_pixels // max(width, 1))
+
+    # Loaded images have no tiles left, so they are always sliced in memory
+    layout = _raw_layout(image)
+    if layout is not None:
+        offset, stride, orientation, pixel_bytes, channels = layout
+        for top in range(0, height, strip_height):
+            rows = min(strip_height, height - top)
+            # Bottom-up files (orientation -1) store the last image row first
+            first_row = top if orientation == 1 else height - top - rows
+            image.fp.seek(offset + first_row * stride)
+            data = np.frombuffer(image.fp.read(rows * stride), dtype=np.uint8).reshape(rows, stride)
+            strip = data[:, :width * pixel_bytes].reshape(rows, width, pixel_bytes)[:, :, channels]
+            yield top, (strip if orientation == 1 else strip[::-1])
+        return
+
+    image.load()
+    for top in range(0, height, strip_height):
+        strip = image.crop((0, top, width, min(height, top + strip_height)))
+        if strip.mode != 'RGB':
+            strip = strip.convert('RGB')
+        yield top, np.asarray(strip)
@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import numpy as np
+
+class MatchLookupTable:
+    """Precomputed nearest-pencil candidates for every cell of a quantized RGB cube"""
+
+    def __init__(self, table, bits, brands, catalog_version, metric='cie76'):
+        """
+        Args:
+            table: (cells, num_brands, candidates) array of catalog rows, padded with -1
+            bits: Bits kept per RGB channel (5 -> 32^3 cells, 6 -> 64^3 cells)
+            brands: Brand names, in the order of the table's second axis
+            catalog_version: MatchingEngine.catalog_version the table was built from
+            metric: Color difference metric the candidates were ranked with
+        """
+        self.table = table
+        self.bits = bits
+        self.brands = list(brands)
+        self.catalog_version = catalog_version
+        self.metric = metric
+        self.num_candidates = table.shape[2]
+        self._brand_lookup = {brand: i for i, brand in enumerate(self.brands)}
+
+    @classmethod
+    def build(cls, engine, bits=5, num_candidates=8, metric='cie76', chunk_size=4096):
+        """
+        Build the table from a MatchingEngine by scoring every cell center against the catalog
+
+        Args:
+            engine: MatchingEngine over the catalog to index
+            bits: Bits kept per RGB channel
+            num_candidates: Candidate pencils stored per brand and cell
+            metric: Color difference metric used to rank the candidates
+            chunk_size: Number of cells scored per distance-matrix pass
+        """
+        levels = 1 << bits
+        step = 256 / levels
+        num_cells = levels ** 3
+
+        # Cell centers in the same r-major order as cell_index()
+        channel = (np.arange(levels) + 0.5) * step
+        r, g, b = np.meshgrid(channel, channel, channel, indexing='ij')
+        centers = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+        dtype = np.int16 if len(engine) < np.iinfo(np.int16).max else np.int32
+        table = np.full((num_cells, len(engine.brands), num_candidates), -1, dtype=dtype)
+        for start in range(0, num_cells, chunk_size):
+            stop = min(start + chunk_size, num_cells)
+            distances = engine.distance_matrix(centers[start:stop], metric=metric)
+            per_brand = engine.top_k_per_brand(distances, num_candidates)
+            for brand_idx, brand in enumerate(engine.brands):
+                for offset, rows in enumerate(per_brand[brand]):
+                    table[start + offset, brand_idx, :len(rows)] = rows
+
+        return cls(table, bits, engine.brands, engine.catalog_version, metric)
+
+    def save(self, path):
+        """Save the table as a .npy file with a .json metadata file next to it"""
+        np.save(path, self.table)
+        with open(self._metadata_path(path), 'w') as f:
+            json.dump({
+                'bits': self.bits,
+                'brands': self.brands,
+                'catalog_version': self.catalog_version,
+                'metric': self.metric
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved table, memory-mapped by default so processes share the pages"""
+        with open(cls._metadata_path(path)) as f:
+            metadata = json.load(f)
+        table = np.load(path, mmap_mode='r' if mmap else None)
+        return cls(
+            table, metadata['bits'], metadata['brands'], metadata['catalog_version'],
+            metadata.get('metric', 'cie76')
+        )
+
+    @staticmethod
+    def _metadata_path(path):
+        return os.path.splitext(path)[0] + '.json'
+
+    def covers(self, k, brands, metric='cie76'):
+        """Check whether k matches per brand under a metric can be answered from the stored candidates"""
+        return (
+            k is not None
+            and k <= self.num_candidates
+            and metric == self.metric
+            and all(b in self._brand_lookup for b in brands)
+        )
+
+    def cell_index(self, colors_rgb):
+        """Map RGB colors to their cell in the quantized cube"""
+        colors = np.clip(np.rint(np.asarray(colors_rgb, dtype=np.float64)), 0, 255)
+        colors = colors.astype(np.intp).reshape(-1, 3) >> (8 - self.bits)
+        return (colors[:, 0] << (2 * self.bits)) | (colors[:, 1] << self.bits) | colors[:, 2]
+
+    def candidates(self, colors_rgb, brand):
+        """Get the (k, num_candidates) candidate catalog rows of a brand, padded with -1"""
+        return np.asarray(self.table[self.cell_index(colors_rgb), self._brand_lookup[brand]], dtype=np.intp)
+
+def main():
+    """Build the lookup table offline: python match_lut.py pencil_match_lut.npy --bits 5"""
+    from pencil_database import PencilDatabase
+    from matching_engine import MatchingEngine
+
+    parser = argparse.ArgumentParser(description="Build the RGB -> nearest pencil lookup table")
+    parser.add_argument('output', help="Path of the .npy file to write")
+    parser.add_argument('--bits', type=int, default=5, help="Bits per RGB channel (5 or 6)")
+    parser.add_argument('--candidates', type=int, default=8, help="Candidate pencils per brand and cell")
+    parser.add_argument('--metric', default='cie76', help="Metric to rank candidates with (cie76, cie94, ciede2000)")
+    args = parser.parse_args()
+
+    engine = MatchingEngine(PencilDatabase())
+    lookup_table = MatchLookupTable.build(
+        engine, bits=args.bits, num_candidates=args.candidates, metric=args.metric
+    )
+    lookup_table.save(args.output)
+    print(f"Wrote {lookup_table.table.shape} lookup table for catalog {engine.catalog_version} to {args.output}")
+
+if __name__ == "__main__":
+    main()
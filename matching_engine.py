@@ -0,0 +1,396 @@
+import hashlib
+import threading
+import numpy as np
+from scipy.spatial import cKDTree
+import color_space
+import color_difference
+
+# KD-trees are built once per catalog version and shared by every engine
+_INDEX_CACHE = {}
+_INDEX_LOCK = threading.Lock()
+
+class MatchingEngine:
+    """Scores target colors against a precomputed Lab array of the whole pencil catalog"""
+
+    # Catalogs at least this large are queried through the KD-tree instead of a full scan
+    INDEX_MIN_SIZE = 1000
+
+    # Candidates fetched per requested match before reranking with a non-Euclidean metric
+    RERANK_OVERSAMPLE = 4
+
+    def __init__(self, pencil_database):
+        catalog = pencil_database.get_catalog_arrays()
+
+        self.brands = list(pencil_database.get_available_brands())
+
+        # Catalog columns, aligned by row (shared read-only arrays from the catalog file)
+        self.names = catalog['name']
+        self.codes = catalog['code']
+        self.brand_names = catalog['brand']
+        self.brand_ids = catalog['brand_id']
+        self.rgb = catalog['rgb']
+
+        # Lab coordinates are precomputed in the catalog file
+        self.lab = catalog['lab']
+
+        # Per-catalog metric terms, so CIE94 / CIEDE2000 only compute the pairwise parts
+        self.chroma = color_difference.chroma(self.lab)
+        self.max_chroma = float(self.chroma.max()) if len(self.chroma) else 0.0
+
+        # Row indices per brand, in catalog order
+        self.brand_rows = {
+            brand: np.flatnonzero(self.brand_ids == i) for i, brand in enumerate(self.brands)
+        }
+
+        self.catalog_version = self._catalog_fingerprint()
+
+        # The engine is shared between sessions and threads, so its arrays are read-only
+        for column in (self.names, self.codes, self.brand_names, self.brand_ids, self.rgb, self.lab, self.chroma):
+            column.setflags(write=False)
+        for rows in self.brand_rows.values():
+            rows.setflags(write=False)
+
+        # Optional MatchLookupTable answering top-k queries from a quantized RGB cube
+        self.lookup_table = None
+
+    def __len__(self):
+        return len(self.lab)
+
+    def _catalog_fingerprint(self):
+        """Hash the catalog contents so derived structures can be shared and invalidated"""
+        digest = hashlib.sha1()
+        digest.update(self.rgb.tobytes())
+        digest.update(self.brand_ids.tobytes())
+        digest.update('\x1f'.join(map(str, self.names)).encode('utf-8'))
+        digest.update('\x1f'.join(map(str, self.codes)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def to_lab(self, colors_rgb):
+        """Convert one RGB color or an (k, 3) array of RGB colors to a (k, 3) float32 Lab array"""
+        colors = np.asarray(colors_rgb)
+        return color_space.rgb_to_lab(colors.reshape(-1, 3))
+
+    def distance_matrix(self, colors_rgb, rows=None, metric='cie76'):
+        """
+        Calculate Delta E between target colors and catalog pencils
+
+        Args:
+            colors_rgb: RGB tuple or (k, 3) array of target colors
+            rows: Optional catalog row indices to restrict the comparison to
+            metric: 'cie76', 'cie94' or 'ciede2000'
+
+        Returns:
+            (k, N) float32 array of color differences
+        """
+        return self.lab_distances(self.to_lab(colors_rgb), rows, metric)
+
+    def lab_distances(self, target_lab, rows=None, metric='cie76'):
+        """
+        Calculate Delta E between (k, 3) Lab targets and catalog rows
+
+        rows may be 1-D (the same rows for every target) or (k, C) (per-target rows).
+        """
+        rows = np.arange(len(self.lab)) if rows is None else np.asarray(rows)
+        target_lab = target_lab[:, None, :]
+        if rows.ndim == 1:
+            catalog_lab, catalog_chroma = self.lab[rows][None, :, :], self.chroma[rows][None, :]
+        else:
+            catalog_lab, catalog_chroma = self.lab[rows], self.chroma[rows]
+
+        if metric == 'cie76':
+            diff = target_lab - catalog_lab
+            return np.sqrt(np.einsum('knc,knc->kn', diff, diff))
+
+        return color_difference.delta_e(
+            target_lab, catalog_lab, metric, chroma2=catalog_chroma
+        ).astype(np.float32, copy=False)
+
+    def top_k(self, distances, k, rows=None, max_difference=None):
+        """
+        Select the k closest catalog rows for every target color
+
+        Args:
+            distances: (num_targets, N) distance matrix over the whole catalog
+            k: Number of rows to keep per target color
+            rows: Optional candidate row indices (e.g. one brand)
+            max_difference: Optional upper bound on the color difference
+
+        Returns:
+            List with one array of catalog row indices per target color, closest first
+        """
+        if rows is None:
+            rows = np.arange(distances.shape[1])
+        candidate_distances = distances[:, rows]
+
+        k = min(k, len(rows))
+        if k <= 0:
+            return [np.empty(0, dtype=np.intp) for _ in range(len(distances))]
+
+        if k < len(rows):
+            part = np.argpartition(candidate_distances, k - 1, axis=1)
+            kth = np.take_along_axis(candidate_distances, part[:, k - 1:k], axis=1)
+        else:
+            kth = np.full((len(distances), 1), np.inf, dtype=candidate_distances.dtype)
+
+        selected = []
+        for i in range(len(distances)):
+            # Keep everything tied with the k-th distance so ties resolve in catalog order
+            cols = np.flatnonzero(candidate_distances[i] <= kth[i, 0])
+            cols = cols[np.argsort(candidate_distances[i, cols], kind='stable')][:k]
+            if max_difference is not None:
+                cols = cols[candidate_distances[i, cols] <= max_difference]
+            selected.append(rows[cols])
+
+        return selected
+
+    def top_k_per_brand(self, distances, k, brands=None, max_difference=None):
+        """
+        Select the k closest pencils of each brand for every target color
+
+        Args:
+            distances: (num_targets, N) distance matrix over the whole catalog
+            k: Number of pencils to keep per brand
+            brands: Brands to include (all catalog brands by default)
+            max_difference: Optional upper bound on the color difference
+
+        Returns:
+            Dictionary mapping brand to a list of row index arrays, one per target color
+        """
+        brands = self.brands if brands is None else brands
+        return {
+            brand: self.top_k(distances, k, self.brand_rows.get(brand, np.empty(0, dtype=np.intp)), max_difference)
+            for brand in brands
+        }
+
+    def candidate_radius(self, target_lab, max_delta, metric='cie76'):
+        """
+        CIE76 search radius that contains every pencil within max_delta under a metric
+
+        CIE94 divides chroma and hue differences by weights of at least 1 that grow with
+        the reference chroma, so the bound is exact. For CIEDE2000 the same bound is taken
+        over the largest possible mean chroma (a' can grow by up to 1.5x) and lightness
+        weight; it ignores the blue-region rotation term.
+        """
+        if metric == 'cie76':
+            return max_delta
+
+        target_chroma = float(np.hypot(target_lab[1], target_lab[2]))
+        if metric == 'cie94':
+            return max_delta * (1 + 0.045 * target_chroma)
+
+        mean_chroma_bound = 1.5 * max(target_chroma, self.max_chroma)
+        return max_delta * max(1.75, 1 + 0.045 * mean_chroma_bound)
+
+    def attach_lookup_table(self, lookup_table):
+        """
+        Use a precomputed MatchLookupTable for top-k queries
+
+        Returns:
+            True if the table was built from this catalog and is now in use
+        """
+        if lookup_table.catalog_version != self.catalog_version:
+            print("Warning: match lookup table was built for a different catalog, ignoring it")
+            return False
+        self.lookup_table = lookup_table
+        return True
+
+    def query_lookup_table(self, colors_rgb, k, brand, max_difference=None, metric='cie76'):
+        """
+        Find the k nearest pencils of a brand from the lookup table candidates
+
+        The table gives a handful of candidates per RGB cell; they are rescored
+        exactly against the target color with the requested metric.
+
+        Returns:
+            List with one (rows, distances) tuple per target color, closest first
+        """
+        candidates = self.lookup_table.candidates(colors_rgb, brand)
+        target_lab = self.to_lab(colors_rgb)
+
+        distances = self.lab_distances(target_lab, np.maximum(candidates, 0), metric)
+        distances[candidates < 0] = np.inf
+
+        results = []
+        for i in range(len(target_lab)):
+            order = np.lexsort((candidates[i], distances[i]))[:k]
+            rows, row_distances = candidates[i, order], distances[i, order]
+            keep = np.isfinite(row_distances)
+            if max_difference is not None:
+                keep &= row_distances <= max_difference
+            results.append((rows[keep], row_distances[keep]))
+
+        return results
+
+    def get_index(self, brand=None):
+        """
+        Get the KD-tree over the Lab coordinates of one brand (or the whole catalog)
+
+        Returns:
+            Tuple of (cKDTree, catalog row index for every tree point)
+        """
+        key = (self.catalog_version, brand)
+        with _INDEX_LOCK:
+            if key not in _INDEX_CACHE:
+                if brand is None:
+                    rows = np.arange(len(self.lab))
+                else:
+                    rows = self.brand_rows.get(brand, np.empty(0, dtype=np.intp))
+                _INDEX_CACHE[key] = (cKDTree(self.lab[rows]), rows)
+            return _INDEX_CACHE[key]
+
+    def query_index(self, colors_rgb, k, brand=None, max_difference=None, metric='cie76'):
+        """
+        Find the k nearest pencils of a brand using the KD-tree
+
+        Euclidean distance in Lab is CIE76, so results are exact for that metric.
+        For CIE94 / CIEDE2000 the tree supplies RERANK_OVERSAMPLE * k CIE76
+        candidates which are rescored with the metric; the k-th rescored distance
+        then bounds a radius query (see candidate_radius) whose pencils are
+        rescored again and cut to k.
+
+        Args:
+            colors_rgb: RGB tuple or (k, 3) array of target colors
+            k: Number of pencils to return per target color
+            brand: Optional brand to search (whole catalog by default)
+            max_difference: Optional search radius
+            metric: 'cie76', 'cie94' or 'ciede2000'
+
+        Returns:
+            List with one (rows, distances) tuple per target color, closest first
+        """
+        tree, tree_rows = self.get_index(brand)
+        target_lab = self.to_lab(colors_rgb)
+
+        rerank = metric != 'cie76'
+        num_candidates = k * self.RERANK_OVERSAMPLE if rerank else k
+        num_candidates = min(num_candidates, len(tree_rows))
+        if num_candidates <= 0:
+            return [(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)) for _ in target_lab]
+
+        upper_bound = np.inf
+        if max_difference is not None and not rerank:
+            upper_bound = max_difference * (1 + 1e-6)
+
+        tree_distances, tree_points = tree.query(
+            target_lab, k=num_candidates, distance_upper_bound=upper_bound
+        )
+        tree_distances = np.asarray(tree_distances).reshape(len(target_lab), -1)
+        tree_points = np.asarray(tree_points).reshape(len(target_lab), -1)
+
+        results = []
+        for i in range(len(target_lab)):
+            found = tree_points[i] < len(tree_rows)
+            rows = tree_rows[tree_points[i][found]]
+            distances = tree_distances[i][found].astype(np.float32)
+
+            if rerank:
+                distances = self.lab_distances(target_lab[i:i + 1], rows, metric)[0]
+                limit = np.sort(distances)[k - 1] if len(distances) >= k else np.inf
+                if max_difference is not None:
+                    limit = min(limit, max_difference)
+                if np.isfinite(limit):
+                    radius = self.candidate_radius(target_lab[i], limit, metric)
+                    rows = tree_rows[np.asarray(tree.query_ball_point(target_lab[i], r=radius), dtype=np.intp)]
+                else:
+                    rows = tree_rows
+                distances = self.lab_distances(target_lab[i:i + 1], rows, metric)[0]
+
+            # Closest first, catalog order for ties
+            order = np.lexsort((rows, distances))
+            rows, distances = rows[order], distances[order]
+            if max_difference is not None:
+                keep = distances <= max_difference
+                rows, distances = rows[keep], distances[keep]
+            results.append((rows[:k], distances[:k]))
+
+        return results
+
+    def query_radius(self, colors_rgb, max_difference, brand=None, metric='cie76'):
+        """
+        Find every pencil of a brand within max_difference of each target color
+
+        For CIE94 / CIEDE2000 the CIE76 search radius is widened per target
+        (see candidate_radius) and the candidates are rescored with the metric.
+
+        Returns:
+            List with one (rows, distances) tuple per target color, closest first
+        """
+        tree, tree_rows = self.get_index(brand)
+        target_lab = self.to_lab(colors_rgb)
+        if len(tree_rows) == 0:
+            return [(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)) for _ in target_lab]
+
+        radii = [self.candidate_radius(lab, max_difference, metric) for lab in target_lab]
+
+        results = []
+        for i, points in enumerate(tree.query_ball_point(target_lab, r=radii)):
+            rows = tree_rows[np.asarray(points, dtype=np.intp)]
+            distances = self.lab_distances(target_lab[i:i + 1], rows, metric)[0]
+            keep = distances <= max_difference
+            rows, distances = rows[keep], distances[keep]
+            order = np.lexsort((rows, distances))
+            results.append((rows[order], distances[order]))
+
+        return results
+
+    def nearest_per_brand(self, colors_rgb, k, brands=None, max_difference=None, use_index=None,
+                          metric='cie76'):
+        """
+        Find the k closest pencils of each brand for every target color
+
+        Queries are answered from the lookup table when one is attached and holds
+        enough candidates. Otherwise small catalogs are scored with one broadcasted
+        distance matrix and catalogs of INDEX_MIN_SIZE pencils or more go through
+        the per-brand KD-trees.
+
+        Args:
+            colors_rgb: RGB tuple or (k, 3) array of target colors
+            k: Number of pencils per brand, or None for every pencil within max_difference
+            brands: Brands to include (all catalog brands by default)
+            max_difference: Optional upper bound on the color difference
+            use_index: Force (True) or disable (False) the KD-tree path
+            metric: 'cie76', 'cie94' or 'ciede2000'
+
+        Returns:
+            Dictionary mapping brand to a list of (rows, distances) tuples, one per target color
+        """
+        brands = self.brands if brands is None else brands
+        if self.lookup_table is not None and self.lookup_table.covers(k, brands, metric):
+            return {
+                brand: self.query_lookup_table(colors_rgb, k, brand, max_difference, metric)
+                for brand in brands
+            }
+
+        if use_index is None:
+            use_index = len(self) >= self.INDEX_MIN_SIZE
+
+        if use_index and k is None and max_difference is not None:
+            return {
+                brand: self.query_radius(colors_rgb, max_difference, brand, metric)
+                for brand in brands
+            }
+
+        if use_index and k is not None:
+            return {
+                brand: self.query_index(colors_rgb, k, brand, max_difference, metric)
+                for brand in brands
+            }
+
+        distances = self.distance_matrix(colors_rgb, metric=metric)
+        k = distances.shape[1] if k is None else k
+        per_brand = self.top_k_per_brand(distances, k, brands, max_difference)
+        return {
+            brand: [(rows, distances[i, rows]) for i, rows in enumerate(rows_per_color)]
+            for brand, rows_per_color in per_brand.items()
+        }
+
+    def match_record(self, row, target_rgb, color_difference):
+        """Build the match dictionary used by the UI, exporter and database for one catalog row"""
+        return {
+            'brand': self.brand_names[row],
+            'name': self.names[row],
+            'code': self.codes[row],
+            'pencil_rgb': tuple(int(c) for c in self.rgb[row]),
+            'target_rgb': target_rgb,
+            'color_difference': float(color_difference)
+        }
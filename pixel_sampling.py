@@ -0,0 +1,60 @@
+import numpy as np
+
+def stratified_sample(height, width, budget, seed=0):
+    """
+    Choose a fixed number of pixels spread evenly over the image
+
+    The image is split into a grid of at least `budget` near-equal cells shaped like the
+    image; `budget` of the cells are picked at random and one random pixel is drawn from
+    each (jittered stratified sampling). Every region of the image is therefore
+    represented in proportion to its area, no pixel is drawn twice, the work is
+    proportional to the budget rather than the image, and the same seed gives the
+    same sample.
+
+    Args:
+        height, width: Image size
+        budget: Number of pixels to draw
+        seed: Random seed
+
+    Returns:
+        Sorted array of flat (row-major) pixel indices; all pixels if budget >= height * width
+    """
+    num_pixels = height * width
+    if budget >= num_pixels:
+        return np.arange(num_pixels)
+
+    grid_x = int(np.clip(round(np.sqrt(budget * width / height)), 1, width))
+    grid_y = min(height, -(-budget // grid_x))
+    if grid_x * grid_y < budget:
+        grid_x = min(width, -(-budget // grid_y))
+
+    rng = np.random.default_rng(seed)
+    cells = rng.choice(grid_x * grid_y, size=budget, replace=False)
+    cell_y, cell_x = cells // grid_x, cells % grid_x
+
+    y_edges = np.arange(grid_y + 1) * height // grid_y
+    x_edges = np.arange(grid_x + 1) * width // grid_x
+    y = y_edges[cell_y] + (rng.random(budget) * (y_edges[cell_y + 1] - y_edges[cell_y])).astype(np.intp)
+    x = x_edges[cell_x] + (rng.random(budget) * (x_edges[cell_x + 1] - x_edges[cell_x])).astype(np.intp)
+
+    return np.sort(y * width + x)
+
+def percentage_error(percentages, sample_size, population, z=1.96):
+    """
+    Sampling error (half-width of the confidence interval, in percentage points) of
+    percentages estimated from a sample, with the finite population correction
+
+    Stratified sampling with proportional allocation is never less precise than simple
+    random sampling, so this simple-random-sampling estimate is conservative.
+
+    Args:
+        percentages: Estimated percentages (0-100)
+        sample_size: Number of sampled pixels the percentages come from
+        population: Number of pixels the sample was drawn from
+        z: Normal quantile of the confidence level (1.96 for 95%)
+    """
+    p = np.asarray(percentages, dtype=np.float64) / 100
+    if sample_size <= 0 or sample_size >= population:
+        return np.zeros_like(p)
+    correction = (population - sample_size) / max(population - 1, 1)
+    return z * np.sqrt(p * (1 - p) / sample_size * correction) * 100
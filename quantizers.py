@@ -0,0 +1,284 @@
+import numpy as np
+from PIL import Image
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+class Quantizer:
+    """Base class for color quantization engines used by ColorAnalyzer"""
+
+    name = None
+
+    # Engines that assume 0-255 RGB input and cannot cluster other color spaces (e.g. Lab)
+    rgb_only = False
+
+    # Iterations and inertia (weighted sum of squared distances to the centers) of the
+    # last fit, for engines that report them
+    n_iter = None
+    inertia = None
+
+    def fit(self, points, num_colors, sample_weight=None):
+        """
+        Find representative colors for a set of (optionally weighted) colors
+
+        Args:
+            points: (N, 3) array of colors
+            num_colors: Number of colors to find (engines may return fewer)
+            sample_weight: Optional (N,) weight of every point
+
+        Returns:
+            Tuple of ((k, 3) float centers, (N,) label of every point)
+        """
+        raise NotImplementedError
+
+    def predict(self, points, centers, chunk_size=65536):
+        """Assign every point to its nearest center (squared Euclidean distance)"""
+        points = np.asarray(points)
+        centers = np.asarray(centers, dtype=np.float32)
+        labels = np.empty(len(points), dtype=np.intp)
+
+        center_norms = np.einsum('kc,kc->k', centers, centers)
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start:start + chunk_size].astype(np.float32)
+            # |p - c|^2 = |p|^2 - 2 p.c + |c|^2; |p|^2 does not change the argmin
+            distances = center_norms[None, :] - 2 * chunk @ centers.T
+            labels[start:start + chunk_size] = np.argmin(distances, axis=1)
+
+        return labels
+
+class KMeansQuantizer(Quantizer):
+    """Full-batch K-means (scikit-learn), the default engine"""
+
+    name = 'kmeans'
+
+    def __init__(self, random_state=42):
+        self.random_state = random_state
+
+    def fit(self, points, num_colors, sample_weight=None):
+        kmeans = KMeans(n_clusters=num_colors, random_state=self.random_state, n_init='auto')
+        kmeans.fit(points, sample_weight=sample_weight)
+        self.n_iter, self.inertia = int(kmeans.n_iter_), float(kmeans.inertia_)
+        return kmeans.cluster_centers_, kmeans.labels_
+
+class MiniBatchKMeansQuantizer(Quantizer):
+    """Mini-batch K-means, for large sample budgets where full-batch fits get slow"""
+
+    name = 'minibatch_kmeans'
+
+    def __init__(self, batch_size=4096, random_state=42):
+        self.batch_size = batch_size
+        self.random_state = random_state
+
+    def fit(self, points, num_colors, sample_weight=None):
+        kmeans = MiniBatchKMeans(
+            n_clusters=num_colors, batch_size=self.batch_size,
+            random_state=self.random_state, n_init=3
+        )
+        kmeans.fit(points, sample_weight=sample_weight)
+        self.n_iter, self.inertia = int(kmeans.n_iter_), float(kmeans.inertia_)
+        return kmeans.cluster_centers_, kmeans.labels_
+
+class MedianCutQuantizer(Quantizer):
+    """Weighted median cut: repeatedly split the box with the widest channel range at its weighted median"""
+
+    name = 'median_cut'
+
+    def fit(self, points, num_colors, sample_weight=None):
+        points = np.asarray(points, dtype=np.float64)
+        weights = np.ones(len(points)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+
+        boxes = [np.arange(len(points))]
+        while len(boxes) < num_colors:
+            # Split the box with the largest weighted channel range
+            scores = []
+            for rows in boxes:
+                if len(rows) < 2:
+                    scores.append(-1.0)
+                    continue
+                ranges = points[rows].max(axis=0) - points[rows].min(axis=0)
+                scores.append(ranges.max() * weights[rows].sum())
+            target = int(np.argmax(scores))
+            if scores[target] <= 0:
+                break
+
+            rows = boxes.pop(target)
+            channel = int(np.argmax(points[rows].max(axis=0) - points[rows].min(axis=0)))
+            rows = rows[np.argsort(points[rows, channel], kind='stable')]
+            cumulative = np.cumsum(weights[rows])
+            split = int(np.searchsorted(cumulative, cumulative[-1] / 2)) + 1
+            split = min(max(split, 1), len(rows) - 1)
+            boxes.extend([rows[:split], rows[split:]])
+
+        labels = np.empty(len(points), dtype=np.intp)
+        centers = np.empty((len(boxes), 3))
+        for i, rows in enumerate(boxes):
+            labels[rows] = i
+            centers[i] = np.average(points[rows], axis=0, weights=weights[rows])
+
+        return centers, labels
+
+class OctreeQuantizer(Quantizer):
+    """Octree quantization: fold the least-populated octree nodes into their parents until few enough leaves remain"""
+
+    name = 'octree'
+    rgb_only = True
+
+    # Leaf keys store the octree level above the (3 bits per level) node code
+    LEVEL_SHIFT = 32
+
+    def __init__(self, depth=6):
+        self.depth = depth
+
+    def fit(self, points, num_colors, sample_weight=None):
+        points = np.asarray(points, dtype=np.float64)
+        weights = np.ones(len(points)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+        depth = self.depth
+
+        # Octree path of every point at the deepest level: 3 bits (one per channel) per level
+        quantized = np.clip(points, 0, 255).astype(np.intp) >> (8 - depth)
+        codes = np.zeros(len(points), dtype=np.intp)
+        for level in range(depth - 1, -1, -1):
+            bits = (quantized >> level) & 1
+            codes = (codes << 3) | (bits[:, 0] << 2) | (bits[:, 1] << 1) | bits[:, 2]
+
+        node_codes, point_nodes = np.unique(codes, return_inverse=True)
+        point_nodes = point_nodes.reshape(-1)
+        node_weights = np.bincount(point_nodes, weights=weights, minlength=len(node_codes))
+
+        # Current leaf of every deepest-level node, as a (level << LEVEL_SHIFT) | code key
+        leaf_keys = (depth << self.LEVEL_SHIFT) | node_codes
+
+        for level in range(depth - 1, -1, -1):
+            leaves, leaf_ids = np.unique(leaf_keys, return_inverse=True)
+            if len(leaves) <= num_colors:
+                break
+
+            # Candidate parents at this level and the distinct leaves below each of them
+            parents = node_codes >> (3 * (depth - level))
+            candidates, inverse = np.unique(parents, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            parent_weights = np.bincount(inverse, weights=node_weights, minlength=len(candidates))
+            pairs = np.unique(inverse * len(leaves) + leaf_ids.reshape(-1))
+            children = np.bincount(pairs // len(leaves), minlength=len(candidates))
+
+            # Fold the fewest-pixel parents first, but never below num_colors leaves
+            order = np.argsort(parent_weights, kind='stable')
+            remaining = len(leaves) - np.cumsum(children[order] - 1)
+            num_folded = int(np.searchsorted(-remaining, -num_colors, side='right'))
+
+            folded = np.isin(inverse, order[:num_folded])
+            leaf_keys[folded] = (level << self.LEVEL_SHIFT) | parents[folded]
+            if num_folded < len(order):
+                break
+
+        leaves, node_leaves = np.unique(leaf_keys, return_inverse=True)
+        node_leaves = node_leaves.reshape(-1)
+        leaf_weights = np.bincount(node_leaves, weights=node_weights, minlength=len(leaves))
+        leaf_sums = np.stack([
+            np.bincount(point_nodes, weights=weights * points[:, c], minlength=len(node_codes)) for c in range(3)
+        ], axis=1)
+        leaf_sums = np.stack([
+            np.bincount(node_leaves, weights=leaf_sums[:, c], minlength=len(leaves)) for c in range(3)
+        ], axis=1)
+
+        # Folding a whole parent can leave a few leaves too many; merge the lightest into their nearest neighbour
+        leaf_map = np.arange(len(leaves))
+        alive = list(range(len(leaves)))
+        while len(alive) > num_colors:
+            lightest = min(alive, key=lambda leaf: leaf_weights[leaf])
+            alive.remove(lightest)
+            centers = leaf_sums[alive] / np.maximum(leaf_weights[alive], 1e-12)[:, None]
+            center = leaf_sums[lightest] / max(leaf_weights[lightest], 1e-12)
+            nearest = alive[int(np.argmin(np.sum((centers - center) ** 2, axis=1)))]
+            leaf_weights[nearest] += leaf_weights[lightest]
+            leaf_sums[nearest] += leaf_sums[lightest]
+            leaf_map[leaf_map == lightest] = nearest
+
+        _, leaf_labels = np.unique(leaf_map, return_inverse=True)
+        labels = leaf_labels.reshape(-1)[node_leaves][point_nodes]
+        centers = leaf_sums[alive] / np.maximum(leaf_weights[alive], 1e-12)[:, None]
+
+        return centers, labels
+
+class PillowQuantizer(Quantizer):
+    """Pillow's native Image.quantize (median cut in C), the fastest engine"""
+
+    name = 'pillow'
+    rgb_only = True
+
+    def __init__(self, max_points=1_000_000):
+        self.max_points = max_points
+
+    def fit(self, points, num_colors, sample_weight=None):
+        points = np.clip(np.rint(np.asarray(points, dtype=np.float64)), 0, 255).astype(np.uint8)
+
+        fit_points = points
+        if sample_weight is not None:
+            # Pillow has no weights; repeat each color by its (scaled) weight instead
+            weights = np.asarray(sample_weight, dtype=np.float64)
+            scale = min(1.0, self.max_points / max(weights.sum(), 1.0))
+            repeats = np.maximum(np.rint(weights * scale), (weights > 0).astype(np.float64)).astype(np.intp)
+            fit_points = np.repeat(points, repeats, axis=0)
+
+        strip = Image.fromarray(fit_points.reshape(-1, 1, 3), 'RGB')
+        quantized = strip.quantize(colors=num_colors, method=Image.Quantize.MEDIANCUT)
+
+        indices = np.asarray(quantized, dtype=np.intp).reshape(-1)
+        used = np.unique(indices)
+        palette = np.array(quantized.getpalette()[:3 * (int(used.max()) + 1)], dtype=np.float64).reshape(-1, 3)
+        centers = palette[used]
+
+        if sample_weight is None:
+            remap = np.zeros(int(used.max()) + 1, dtype=np.intp)
+            remap[used] = np.arange(len(used))
+            return centers, remap[indices]
+        return centers, self.predict(points, centers)
+
+def assign_labels(pixels, centers, quantizer=None, bits=8, transform=None):
+    """
+    Label uint8 pixels through a color key -> cluster table instead of a distance pass per pixel
+
+    Every distinct (quantized) color is labelled once; the pixels are then labelled with a
+    single gather over their color keys.
+
+    Args:
+        pixels: (N, 3) uint8 array of colors
+        centers: (k, 3) cluster centers
+        quantizer: Quantizer whose predict() labels the table (default: nearest center)
+        bits: Bits kept per channel; 8 labels every exact color, fewer bits label each
+            bin by its midpoint using a dense table
+        transform: Optional function mapping the table's RGB colors into the space the
+            centers live in (e.g. color_space.rgb_to_lab)
+
+    Returns:
+        (N,) array of cluster labels
+    """
+    quantizer = quantizer or Quantizer()
+    transform = transform or (lambda colors: colors)
+    pixels = np.asarray(pixels)
+    if len(pixels) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    if bits >= 8:
+        keys = (pixels[:, 0].astype(np.int32) << 16) | (pixels[:, 1].astype(np.int32) << 8) | pixels[:, 2]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        unique_colors = np.stack([(unique_keys >> 16) & 0xFF, (unique_keys >> 8) & 0xFF, unique_keys & 0xFF], axis=1)
+        return quantizer.predict(transform(unique_colors), centers)[inverse.reshape(-1)]
+
+    quantized = (pixels >> (8 - bits)).astype(np.intp)
+    keys = (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+    bins = np.arange(1 << (3 * bits))
+    levels = np.stack([bins >> (2 * bits), (bins >> bits) & ((1 << bits) - 1), bins & ((1 << bits) - 1)], axis=1)
+    midpoints = (levels << (8 - bits)) + (1 << (7 - bits))
+    return quantizer.predict(transform(midpoints), centers)[keys]
+
+# Engine name -> class
+QUANTIZERS = {
+    quantizer.name: quantizer
+    for quantizer in (KMeansQuantizer, MiniBatchKMeansQuantizer, MedianCutQuantizer, OctreeQuantizer, PillowQuantizer)
+}
+
+def get_quantizer(engine):
+    """Create the quantizer for an engine name (see QUANTIZERS)"""
+    try:
+        return QUANTIZERS[engine]()
+    except KeyError:
+        raise ValueError(f"Unknown quantizer engine '{engine}', expected one of {tuple(QUANTIZERS)}")
@@ -0,0 +1,107 @@
+import numpy as np
+
+def color_keys(pixels, bits):
+    """Histogram bin of every (N, 3) uint8 color with `bits` bits kept per channel"""
+    quantized = (pixels >> (8 - bits)).astype(np.intp)
+    return (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+
+class StripStatistics:
+    """
+    Fixed-size color and spatial statistics accumulated over the strips of an image
+
+    Memory does not depend on the image size: a color histogram with `bits` bits per
+    channel (pixel counts, brightness-filtered counts and RGB sums per bin) plus, for a
+    coarser `spatial_bits` histogram, the pixel count of every bin per horizontal and
+    per vertical band of the image.
+    """
+
+    def __init__(self, width, height, bits=6, spatial_bits=4, bands=60):
+        """
+        Args:
+            width, height: Size of the full image
+            bits: Bits per channel of the color histogram that is clustered
+            spatial_bits: Bits per channel of the histogram the band profiles are kept for
+            bands: Number of horizontal and vertical bands (capped at the image size)
+        """
+        self.width = width
+        self.height = height
+        self.bits = bits
+        self.spatial_bits = spatial_bits
+        self.row_bands = min(bands, height)
+        self.col_bands = min(bands, width)
+
+        num_bins = 1 << (3 * bits)
+        num_spatial_bins = 1 << (3 * spatial_bits)
+        self.counts = np.zeros(num_bins, dtype=np.int64)
+        self.filtered_counts = np.zeros(num_bins, dtype=np.int64)
+        self.sums = np.zeros((num_bins, 3), dtype=np.float64)
+        self.row_counts = np.zeros((num_spatial_bins, self.row_bands), dtype=np.int64)
+        self.col_counts = np.zeros((num_spatial_bins, self.col_bands), dtype=np.int64)
+
+        # Band of every column never changes between strips
+        self._col_band = (np.arange(width) * self.col_bands // width).astype(np.intp)
+
+    def add_strip(self, top, strip, mask):
+        """
+        Accumulate one strip
+
+        Args:
+            top: Image row of the strip's first row
+            strip: (rows, width, 3) uint8 array
+            mask: (rows * width,) boolean mask of the pixels that count towards the clustering weights
+        """
+        rows = strip.shape[0]
+        pixels = strip.reshape(-1, 3)
+        num_bins = len(self.counts)
+
+        keys = color_keys(pixels, self.bits)
+        self.counts += np.bincount(keys, minlength=num_bins)
+        self.filtered_counts += np.bincount(keys[mask], minlength=num_bins)
+        for c in range(3):
+            self.sums[:, c] += np.bincount(keys, weights=pixels[:, c], minlength=num_bins)
+
+        spatial_keys = color_keys(pixels, self.spatial_bits).reshape(rows, self.width)
+        num_spatial_bins = len(self.row_counts)
+        row_band = (np.arange(top, top + rows) * self.row_bands // self.height).astype(np.intp)
+        self.row_counts += np.bincount(
+            (spatial_keys * self.row_bands + row_band[:, None]).ravel(),
+            minlength=num_spatial_bins * self.row_bands
+        ).reshape(num_spatial_bins, self.row_bands)
+        self.col_counts += np.bincount(
+            (spatial_keys * self.col_bands + self._col_band[None, :]).ravel(),
+            minlength=num_spatial_bins * self.col_bands
+        ).reshape(num_spatial_bins, self.col_bands)
+
+    def spatial_bins(self, bins):
+        """Coarse (spatial_bits) bin of every fine (bits) histogram bin"""
+        bins = np.asarray(bins, dtype=np.intp)
+        mask = (1 << self.bits) - 1
+        shift = self.bits - self.spatial_bits
+        channels = [(bins >> (2 * self.bits)) & mask, (bins >> self.bits) & mask, bins & mask]
+        r, g, b = (channel >> shift for channel in channels)
+        return (r << (2 * self.spatial_bits)) | (g << self.spatial_bits) | b
+
+    def merge(self, other):
+        """
+        Add the statistics of another image (e.g. the next frame of an animation)
+
+        Both must use the same histogram bits. If the other image has a different size,
+        its bands are mapped proportionally onto this one's bands.
+        """
+        if (other.bits, other.spatial_bits) != (self.bits, self.spatial_bits):
+            raise ValueError("Cannot merge strip statistics with different histogram bits")
+
+        self.counts += other.counts
+        self.filtered_counts += other.filtered_counts
+        self.sums += other.sums
+        self.row_counts += _rebin_bands(other.row_counts, self.row_bands)
+        self.col_counts += _rebin_bands(other.col_counts, self.col_bands)
+
+def _rebin_bands(band_counts, bands):
+    """Map (bins, n) per-band counts onto `bands` bands covering the same extent"""
+    if band_counts.shape[1] == bands:
+        return band_counts
+    target = np.arange(band_counts.shape[1]) * bands // band_counts.shape[1]
+    rebinned = np.zeros((band_counts.shape[0], bands), dtype=band_counts.dtype)
+    np.add.at(rebinned.T, target, band_counts.T)
+    return rebinned
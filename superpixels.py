@@ -0,0 +1,83 @@
+import numpy as np
+
+def slic(lab_image, step=8, compactness=10.0, iterations=4):
+    """
+    Over-segment an image into compact superpixels of similar color (SLIC on a regular grid)
+
+    Superpixel centers start on a grid of step x step cells. Every iteration assigns each
+    pixel to the nearest of the 3 x 3 centers around its cell, by Lab distance plus
+    spatial distance scaled by compactness / step, and moves every center to the mean
+    of its pixels. The image is padded to whole cells and viewed as a
+    (rows, step, cols, step) block array, so each of the nine candidate centers is
+    compared with every pixel by broadcasting, one channel at a time and without
+    per-pixel gathers. Connectivity is not enforced, so a superpixel can occasionally
+    be split in two pieces.
+
+    Args:
+        lab_image: (height, width, 3) float32 Lab image
+        step: Grid spacing, i.e. the approximate superpixel width in pixels
+        compactness: Weight of spatial against color distance (higher = more regular shapes)
+        iterations: Number of assignment / update rounds
+
+    Returns:
+        Tuple of ((height, width) superpixel index of every pixel, number of superpixels);
+        indices are consecutive, every superpixel has at least one pixel
+    """
+    height, width = lab_image.shape[:2]
+    step = max(1, min(int(step), height, width))
+    grid_y, grid_x = -(-height // step), -(-width // step)
+    num_centers = grid_y * grid_x
+
+    # L, a, b as (grid_y, step, grid_x, step) blocks; padding repeats the edge pixels
+    padding = ((0, grid_y * step - height), (0, grid_x * step - width))
+    channels = [np.pad(lab_image[..., c].astype(np.float32, copy=False), padding, mode='edge')
+                .reshape(grid_y, step, grid_x, step) for c in range(3)]
+    inside = np.pad(np.ones((height, width), dtype=bool), padding).reshape(grid_y, step, grid_x, step)
+    # Pixel coordinates only vary along their own axes, so they stay broadcastable
+    ys = np.minimum(np.arange(grid_y * step), height - 1).astype(np.float32).reshape(grid_y, step, 1, 1)
+    xs = np.minimum(np.arange(grid_x * step), width - 1).astype(np.float32).reshape(1, 1, grid_x, step)
+
+    cell_ids = np.arange(num_centers).reshape(grid_y, 1, grid_x, 1)
+    labels = np.broadcast_to(cell_ids, inside.shape)
+    centers = _center_means(channels, ys, xs, inside, labels, num_centers, None)
+
+    spatial_weight = np.float32((compactness / step) ** 2)
+    offsets = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+    for _ in range(iterations):
+        # Centers padded with a border of unreachable ones, so shifted views line up with the cells
+        padded = np.pad(centers.reshape(grid_y, grid_x, 5), ((1, 1), (1, 1), (0, 0)), constant_values=np.inf)
+        best = np.full(inside.shape, np.inf, dtype=np.float32)
+        best_offset = np.zeros(inside.shape, dtype=np.int8)
+        for index, (dy, dx) in enumerate(offsets):
+            center = padded[1 + dy:1 + dy + grid_y, 1 + dx:1 + dx + grid_x][:, None, :, None, :]
+            distance = (channels[0] - center[..., 0]) ** 2
+            distance += (channels[1] - center[..., 1]) ** 2
+            distance += (channels[2] - center[..., 2]) ** 2
+            distance += spatial_weight * ((ys - center[..., 3]) ** 2 + (xs - center[..., 4]) ** 2)
+            closer = distance < best
+            np.copyto(best, distance, where=closer)
+            np.copyto(best_offset, index, where=closer)
+
+        offset_y = np.array([dy for dy, _ in offsets])[best_offset]
+        offset_x = np.array([dx for _, dx in offsets])[best_offset]
+        labels = cell_ids + offset_y * grid_x + offset_x
+        centers = _center_means(channels, ys, xs, inside, labels, num_centers, centers)
+
+    # Back to image layout, then renumber the superpixels that kept pixels consecutively
+    labels = labels.reshape(grid_y * step, grid_x * step)[:height, :width]
+    used, labels = np.unique(labels, return_inverse=True)
+    return labels.reshape(height, width), len(used)
+
+def _center_means(channels, ys, xs, inside, labels, num_centers, previous):
+    """(num_centers, 5) mean L, a, b, y, x of every center's pixels; centers without pixels keep their previous value"""
+    labels = labels[inside]
+    counts = np.bincount(labels, minlength=num_centers).astype(np.float32)
+    features = list(channels) + [np.broadcast_to(ys, inside.shape), np.broadcast_to(xs, inside.shape)]
+    sums = np.stack([
+        np.bincount(labels, weights=feature[inside], minlength=num_centers) for feature in features
+    ], axis=1).astype(np.float32)
+    means = sums / np.maximum(counts, 1)[:, None]
+    if previous is not None:
+        means[counts == 0] = previous[counts == 0]
+    return means